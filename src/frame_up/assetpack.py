@@ -0,0 +1,233 @@
+"""
+Frame assets, pre-decoded and memory-mapped.
+
+A pack is one file: a JSON manifest (per orientation: size, window, inner
+box, border widths and the resolutions on hand) followed by the raw pixels
+of each asset's 9-slice pieces (see framing.FrameSlices) at each resolution,
+with the frame's alpha mask (see framing.find_window) built in.
+Processes map it read-only, so nobody decodes a JPEG at startup and a pool
+of workers shares one copy of the pages.
+
+`frame-up pack` builds one. Without a path it goes to the user's cache,
+where framing finds it and checks it was built from the current assets.
+FRAME_UP_ASSET_PACK points at a pack to use as it is.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+from importlib.resources import files
+from importlib.resources.abc import Traversable
+from pathlib import Path
+from typing import Any, Mapping, Optional, Union, cast
+
+from PIL import Image as im
+from PIL.Image import Image
+
+from frame_up.constants import cache_dir, version
+from frame_up.tracing import span
+
+magic = b"FUPACK02"
+pack_env = "FRAME_UP_ASSET_PACK"
+
+# resolutions to store, as a fraction of the source asset
+pack_scales = [1.0, 0.5, 0.25]
+
+# pillow can only map 4-byte modes without copying them, and the alpha is
+# the frame's mask
+pack_mode = "RGBA"
+
+Source = Traversable  # a Path, or a file bundled with the package
+
+
+class AssetPack:
+    """A pack file mapped into memory, hands out read-only pieces of it"""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[: len(magic)] != magic:
+            raise ValueError("Not a frame asset pack: ", str(path))
+        start = len(magic) + 8
+        length = int.from_bytes(self.map[len(magic) : start], "little")
+        self.manifest: dict[str, Any] = json.loads(self.map[start : start + length])
+        self.assets: dict[str, dict[str, Any]] = self.manifest["assets"]
+        self.data_offset: int = self.manifest["data_offset"]
+
+    def resolution(self, orientation: str, scale: float) -> dict[str, Any]:
+        """The smallest stored resolution at least `scale`"""
+        resolutions = sorted(
+            self.assets[orientation]["resolutions"], key=lambda r: r["scale"]
+        )
+        for resolution in resolutions:
+            if resolution["scale"] >= scale:
+                return resolution
+        return resolutions[-1]
+
+    def piece(self, resolution: dict[str, Any], name: str) -> Image:
+        """One piece, backed by the mapped file (read-only, no copy)"""
+        entry = resolution["pieces"][name]
+        width, height = entry["size"]
+        start = self.data_offset + entry["offset"]
+        data = memoryview(self.map)[start : start + width * height * 4]
+        # pillow takes any buffer, its stubs only say bytes
+        return im.frombuffer(
+            pack_mode, (width, height), cast(bytes, data), "raw", pack_mode, 0, 1
+        )
+
+
+def default_sources() -> dict[str, Source]:
+    from frame_up.framing import frame_files
+
+    return {
+        orientation: files("frame_up.data").joinpath(name)
+        for orientation, name in frame_files.items()
+    }
+
+
+def default_pack_path() -> Path:
+    return cache_dir / f"frames-{version}.pack"
+
+
+def fingerprint(sources: dict[str, Source]) -> str:
+    """Changes whenever the packed pixels would"""
+    from frame_up.framing import window_threshold
+
+    digest = hashlib.sha1(f"{magic!r} {pack_scales} {window_threshold}".encode())
+    for orientation in sorted(sources):
+        digest.update(orientation.encode())
+        digest.update(sources[orientation].read_bytes())
+    return digest.hexdigest()
+
+
+def build_pack(
+    path: Union[str, Path, None] = None,
+    sources: Optional[Mapping[str, Union[str, Source]]] = None,
+) -> Path:
+    """
+    Decode `sources` ({orientation: image}, the bundled assets by default),
+    find their windows, cut each into 9-slice pieces at every scale in
+    pack_scales and write it all to `path` (the user's cache by default)
+    """
+    from frame_up.framing import cut_slices, find_window
+
+    path = Path(path) if path else default_pack_path()
+    assets_from: dict[str, Source] = {
+        orientation: Path(source) if isinstance(source, str) else source
+        for orientation, source in (sources or default_sources()).items()
+    }
+
+    assets: dict[str, dict[str, Any]] = {}
+    blobs: list[bytes] = []
+    offset = 0
+    with span("assetpack.build", path=str(path)):
+        for orientation, source in assets_from.items():
+            with source.open("rb") as f:
+                decoded = im.open(f)
+                decoded.load()
+            alpha, geometry = find_window(decoded)
+            frame = decoded.convert(pack_mode)
+            frame.putalpha(alpha)
+
+            resolutions = []
+            for scale in pack_scales:
+                size = (round(frame.width * scale), round(frame.height * scale))
+                scaled = frame if scale == 1 else frame.resize(size)
+                borders = [max(1, round(border * scale)) for border in geometry.borders]
+                cut = cut_slices(scaled, tuple(borders))  # type: ignore
+
+                pieces = {}
+                for name, piece in [*cut.corners.items(), *cut.edges.items()]:
+                    pieces[name] = {"size": piece.size, "offset": offset}
+                    blob = piece.tobytes()
+                    blobs.append(blob)
+                    offset += len(blob)
+                resolutions.append(
+                    {"scale": scale, "size": size, "borders": borders, "pieces": pieces}
+                )
+
+            left, top, right, bottom = geometry.borders
+            assets[orientation] = {
+                "source": getattr(source, "name", str(source)),
+                "size": geometry.size,
+                "window": geometry.window,
+                "inner_box": geometry.inner_box,
+                "border": {"left": left, "top": top, "right": right, "bottom": bottom},
+                "resolutions": resolutions,
+            }
+
+        manifest = {
+            "version": version,
+            "mode": pack_mode,
+            "fingerprint": fingerprint(assets_from),
+            "assets": assets,
+            "data_offset": 0,
+        }
+        # pixel data starts on a page boundary after the header, which has
+        # to know where that is: grow the guess until it fits
+        header_size = len(magic) + 8
+        while True:
+            encoded = json.dumps(manifest).encode()
+            pages = -(-(header_size + len(encoded)) // mmap.PAGESIZE)
+            data_offset = pages * mmap.PAGESIZE
+            if manifest["data_offset"] == data_offset:
+                break
+            manifest["data_offset"] = data_offset
+
+        # same as file.save_to_disk: other processes only ever see a whole pack
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".frames-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(magic)
+                f.write(len(encoded).to_bytes(8, "little"))
+                f.write(encoded)
+                f.write(b"\0" * (data_offset - header_size - len(encoded)))
+                for blob in blobs:
+                    f.write(blob)
+            os.chmod(temp_path, 0o644)  # mkstemp makes it private
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    return path
+
+
+def load_pack(path: Union[str, Path, None] = None) -> Optional[AssetPack]:
+    """
+    The pack at `path`, or FRAME_UP_ASSET_PACK, taken as it is. Otherwise the
+    one in the user's cache if it matches the bundled assets. None if there's
+    no (usable) pack, and framing decodes the JPEGs like before.
+    """
+    explicit = path or os.environ.get(pack_env)
+    if explicit:
+        return AssetPack(explicit)
+
+    path = default_pack_path()
+    if not path.exists():
+        return None
+    try:
+        pack = AssetPack(path)
+    except (OSError, ValueError) as e:
+        print(f"[assets] ignoring unreadable asset pack {path}: {e}")
+        return None
+
+    if pack.manifest.get("fingerprint") != fingerprint(default_sources()):
+        return None  # built from different assets, ensure_pack() replaces it
+    return pack
+
+
+def ensure_pack() -> Optional[Path]:
+    """Build the cached pack if it's missing or stale. None if that failed."""
+    if os.environ.get(pack_env):
+        return Path(os.environ[pack_env])
+    if load_pack() is not None:
+        return default_pack_path()
+    try:
+        return build_pack()
+    except OSError as e:
+        print(f"[assets] couldn't build the asset pack: {e}")
+        return None
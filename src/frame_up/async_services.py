@@ -0,0 +1,220 @@
+"""
+asyncio versions of the frame_up.services calls.
+
+Same configuration (service_index, service_replicas, filter_modes, caches)
+as the blocking functions, but any number of requests can be in flight at once,
+spread over a service's replicas, each with its own timeout and cancellable.
+"""
+
+import asyncio
+from typing import Any, Callable, Optional, cast
+from weakref import WeakKeyDictionary
+
+import zmq
+import zmq.asyncio
+from PIL.Image import Image
+
+from frame_up import filters, services
+from frame_up.models import ImageEmailPayload
+from frame_up.serialization import Buffer
+from frame_up.services import (
+    ConnectionPool,
+    build_service_request,
+    filter_request,
+    filter_result,
+    filter_steps,
+    get_endpoints,
+    read_service_reply,
+)
+from frame_up.tracing import log
+
+# asyncio sockets belong to the loop that made them, so one pool per loop
+pools: "WeakKeyDictionary[asyncio.AbstractEventLoop, ConnectionPool]" = (
+    WeakKeyDictionary()
+)
+
+# requests currently waiting on each endpoint, to pick the least busy replica
+in_flight: dict[str, int] = {}
+
+
+def get_pool() -> ConnectionPool:
+    loop = asyncio.get_running_loop()
+    pool = pools.get(loop)
+    if pool is None:
+        pool = pools[loop] = ConnectionPool(zmq.asyncio.Context)
+    return pool
+
+
+def close_pool() -> None:
+    """Call before the event loop goes away"""
+    pool = pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        pool.close()
+
+
+async def request_async(
+    endpoint: str, request: list[Buffer], timeout: float
+) -> Optional[list[zmq.Frame]]:
+    """
+    The reply, or None if the request went out but no answer came back in
+    `timeout` seconds. Raises zmq.ZMQError if it couldn't be sent at all.
+    """
+    pool = get_pool()
+
+    # a pooled socket may have gone stale, that gets one retry on a fresh one
+    while True:
+        pooled, reused = pool.acquire(endpoint)
+        socket = cast(zmq.asyncio.Socket, pooled)
+        in_flight[endpoint] = in_flight.get(endpoint, 0) + 1
+        try:
+            try:
+                await socket.send_multipart(request, copy=False)
+            except zmq.ZMQError:
+                pool.discard(socket)
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                # cancelled: some of the frames may be out already
+                pool.discard(socket)
+                raise
+            try:
+                reply = await asyncio.wait_for(
+                    socket.recv_multipart(copy=False), timeout
+                )
+            except (zmq.ZMQError, asyncio.TimeoutError) as e:
+                print(f"[zmq] no reply from {endpoint}: {e!r}")
+                pool.discard(socket)
+                return None
+            except BaseException:
+                # cancelled: the REQ socket is stuck waiting for a reply
+                pool.discard(socket)
+                raise
+        finally:
+            in_flight[endpoint] -= 1
+
+        pool.release(endpoint, socket)
+        return reply
+
+
+async def send_recv_service_async(
+    service: str,
+    frames: Callable[[str], list[Buffer]],
+    payload: Callable[[dict[str, Any]], str],
+    *,
+    timeout: Optional[float] = None,
+) -> tuple[Optional[dict[str, Any]], Optional[Image]]:
+    """
+    Like services.send_recv_service, but tries the least busy replica first.
+    Only a request that couldn't be sent moves on to the next replica: one
+    that timed out (after `timeout` seconds, default: the "recv" timeout) may
+    still be running, so it isn't sent anywhere else.
+    """
+    if timeout is None:
+        timeout = services.timeouts["recv"] / 1000
+
+    # encoding/decoding runs in a thread so other requests keep moving
+    protocol, request = await asyncio.to_thread(
+        build_service_request, service, frames, payload
+    )
+
+    endpoints = sorted(get_endpoints(service), key=lambda e: in_flight.get(e, 0))
+    for endpoint in endpoints:
+        try:
+            reply = await request_async(endpoint, request, timeout)
+        except zmq.ZMQError as e:
+            print(f"[zmq] couldn't send to {endpoint}: {e!r}")
+            continue
+        if reply is None:
+            break
+        return await asyncio.to_thread(read_service_reply, service, protocol, reply)
+
+    return None, None
+
+
+async def get_remote_filtered_image_async(
+    filter: str, image: Image, intensity: float = 1, *, timeout: Optional[float] = None
+) -> Image:
+    log("[zmq] 🖼️  async filter request", "zmq", filter=filter)
+
+    response, result = await send_recv_service_async(
+        filter, *filter_request(image, intensity), timeout=timeout
+    )
+    return filter_result(filter, response, result)
+
+
+async def get_filtered_image_async(
+    filter: str,
+    image: Image,
+    intensity: float = 1,
+    *,
+    mode: Optional[str] = None,
+    exact: Optional[bool] = None,
+    timeout: Optional[float] = None,
+) -> Image:
+    """Same behaviour as services.get_filtered_image (see services.filter_steps)"""
+    steps = filter_steps(filter, image, intensity, mode, exact)
+    result: Any = None
+    error: Optional[Exception] = None
+    while True:
+        try:
+            kind, args = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as done:
+            return done.value
+
+        result, error = None, None
+        try:
+            match kind:
+                case "filter":
+                    filter, image, intensity, mode, exact = args
+                    result = await get_filtered_image_async(
+                        filter,
+                        image,
+                        intensity,
+                        mode=mode,
+                        exact=exact,
+                        timeout=timeout,
+                    )
+                case "remote":
+                    result = await get_remote_filtered_image_async(
+                        *args, timeout=timeout
+                    )
+                case _:
+                    # pixel work runs in a thread so other requests keep moving
+                    result = await asyncio.to_thread(*args)
+        except Exception as e:
+            error = e
+
+
+async def get_all_filtered_images_async(
+    image: Image,
+    intensity: float = 1,
+    names: Optional[list[str]] = None,
+    *,
+    timeout: Optional[float] = None,
+) -> dict[str, Image]:
+    """Every filter (or just `names`) at once, e.g. for speculative previews"""
+    if names is None:
+        names = list(filters.local_filters)
+    results = await asyncio.gather(
+        *(
+            get_filtered_image_async(name, image, intensity, timeout=timeout)
+            for name in names
+        )
+    )
+    return dict(zip(names, results))
+
+
+async def email_image_async(
+    payload: ImageEmailPayload, *, timeout: Optional[float] = None
+) -> bool:
+    response, _ = await send_recv_service_async(
+        "email",
+        payload.to_microservice_frames,
+        payload.to_microservice_json,
+        timeout=timeout,
+    )
+
+    if not response or not response["success"]:
+        raise SystemError("send_email failed")
+    return response["success"]
@@ -0,0 +1,172 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from glob import glob
+from pathlib import Path
+from typing import Iterable, Optional
+
+from frame_up.assetpack import ensure_pack
+from frame_up.constants import accepted_image_extensions
+from frame_up.file import framed_name, reserve_filepath, save_to_disk
+from frame_up.framing import fit_frame_size, frame_image
+from frame_up.pipeline import open_for_frame, read_source
+from frame_up.services import get_filtered_image
+
+
+@dataclass
+class BatchResult:
+    processed: int = 0
+    failed: list[tuple[str, str]] = field(default_factory=list)  # (path, error)
+    seconds: float = 0.0
+
+    @property
+    def images_per_second(self) -> float:
+        if self.seconds <= 0:
+            return 0.0
+        return self.processed / self.seconds
+
+
+def is_image_path(path: Path) -> bool:
+    return path.is_file() and path.suffix.lower() in accepted_image_extensions
+
+
+def is_framed_output(path: Path) -> bool:
+    """Named like something this program wrote, see file.get_suggested_filepath"""
+    return framed_name.fullmatch(path.stem) is not None
+
+
+def collect_inputs(sources: Iterable[str], *, recursive: bool = False) -> list[Path]:
+    """
+    Expand directories and glob patterns into a sorted, de-duplicated
+    list of image paths. Earlier outputs (name_framed_N) found that way are
+    left out, or every run over the same folder would frame them again.
+    Files named directly are always taken.
+    """
+    found: set[Path] = set()
+    for source in sources:
+        source = os.path.expanduser(source)
+        path = Path(source)
+        candidates: Iterable[Path]
+        if path.is_dir():
+            candidates = path.rglob("*") if recursive else path.iterdir()
+        elif path.is_file():
+            if is_image_path(path):
+                found.add(path.resolve())
+            continue
+        else:
+            # not a real path, so treat it as a glob pattern
+            candidates = (Path(p) for p in glob(source, recursive=recursive))
+
+        found.update(
+            p.resolve()
+            for p in candidates
+            if is_image_path(p) and not is_framed_output(p)
+        )
+    return sorted(found)
+
+
+def frame_file(
+    source: str,
+    destination: str,
+    filter: Optional[str] = None,
+    intensity: float = 1,
+    filter_mode: Optional[str] = None,
+    preset: Optional[str] = None,
+) -> str:
+    """Open, filter, frame and save a single image. Runs inside a worker process."""
+    _, image_size = read_source(source)
+    size = fit_frame_size(image_size)
+    image = open_for_frame(source, size)
+    if filter is not None:
+        image = get_filtered_image(filter, image, intensity, mode=filter_mode)
+    framed = frame_image(image, size, threads=1)  # the pool already uses every core
+    save_to_disk(destination, framed, preset=preset)
+    return destination
+
+
+def reserve_output(source: Path, output_dir: Optional[Path] = None) -> Path:
+    """
+    Claim the output path for `source` before its job starts, so neither the
+    workers nor another batch running at the same time end up with the same name
+    """
+    directory = output_dir if output_dir is not None else source.parent
+    return reserve_filepath(directory, source.name)
+
+
+def release_output(destination: Path) -> None:
+    """Remove a reserved path that never got its image"""
+    try:
+        if destination.stat().st_size == 0:
+            destination.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def run_batch(
+    inputs: list[Path],
+    output_dir: Optional[Path] = None,
+    *,
+    workers: Optional[int] = None,
+    filter: Optional[str] = None,
+    intensity: float = 1,
+    filter_mode: Optional[str] = None,
+    preset: Optional[str] = None,
+    verbose: bool = True,
+) -> BatchResult:
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    # workers map the pack instead of each decoding the frame assets
+    ensure_pack()
+
+    result = BatchResult()
+    start = time.perf_counter()
+
+    # reserved paths that don't have their image yet, whatever stops the batch
+    # (failures, Ctrl-C, a dead worker) they shouldn't be left behind empty
+    unfinished: set[Path] = set()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            try:
+                for source in inputs:
+                    destination = reserve_output(source, output_dir)
+                    unfinished.add(destination)
+                    future = pool.submit(
+                        frame_file,
+                        str(source),
+                        str(destination),
+                        filter,
+                        intensity,
+                        filter_mode,
+                        preset,
+                    )
+                    futures[future] = (source, destination)
+
+                for future in as_completed(futures):
+                    source, destination = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        result.failed.append((str(source), str(e)))
+                        if verbose:
+                            print(f"[batch] ❌ {source}: {e}")
+                        continue
+
+                    unfinished.discard(destination)
+                    result.processed += 1
+                    if verbose:
+                        print(f"[batch] 🖼️  {source} -> {destination}")
+            except BaseException:
+                # don't start the rest on the way out
+                pool.shutdown(cancel_futures=True)
+                raise
+    finally:
+        for destination in unfinished:
+            release_output(destination)
+
+    result.seconds = time.perf_counter() - start
+    return result
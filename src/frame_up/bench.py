@@ -0,0 +1,466 @@
+"""
+Benchmarks for the image paths that matter: framing, serialization, disk
+and the service round trips (against local stand-in servers).
+
+Every (case, size) runs in a fresh worker process so peak RSS belongs to that
+case alone. Results go out as JSON and can be checked against a baseline
+from an earlier run, see `frame-up bench --help`.
+"""
+
+import json
+import math
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import PIL
+from PIL import Image as im
+from PIL.Image import Image
+
+from frame_up.constants import version
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None  # type: ignore
+
+# megapixels
+default_sizes: list[float] = [1, 10, 100]
+default_repeat = 5
+# stop repeating a case once it has taken this long (seconds), min. 1 run
+case_time_budget = 30.0
+# slower than the baseline by more than this fraction counts as a regression
+regression_threshold = 0.10
+# service timeouts (ms) for the stand-in cases: a 100 MP round trip moves
+# hundreds of MB each way, which takes longer than the app's 5 seconds
+standin_timeouts = {"send": 60 * 1000, "recv": 120 * 1000}
+
+# fork would copy the parent's memory (and stand-in threads) into the worker
+spawn = multiprocessing.get_context("spawn")
+
+# the frame_image_<n>t cases, for frame_image's speedup per resize thread
+resize_thread_counts = [1, 2, 4, 8]
+
+remote_cases = {"get_filtered_image": "monochrome", "email_image": "email"}
+
+
+@dataclass
+class BenchResult:
+    case: str
+    megapixels: float
+    runs: int
+    # all None if the case failed, see `error`
+    mean_ms: Optional[float]
+    p50_ms: Optional[float]
+    p99_ms: Optional[float]
+    ops_per_sec: Optional[float]
+    megapixels_per_sec: Optional[float]
+    peak_rss_mb: Optional[float]
+    error: Optional[str] = None
+
+
+def make_image(megapixels: float) -> Image:
+    """A 4:3 RGB test image: gradients plus noise, so it compresses like a photo"""
+    width = round(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = round(width * 3 / 4)
+    red = im.linear_gradient("L").resize((width, height))
+    green = im.effect_noise((width, height), 48)
+    blue = im.radial_gradient("L").resize((width, height))
+    return im.merge("RGB", (red, green, blue))
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Nearest rank, no interpolation"""
+    ordered = sorted(samples)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+#
+#   Cases: each one does its setup and returns the function to time
+#
+
+
+def case_frame_image(image: Image, workdir: Path) -> Callable[[], Any]:
+    from frame_up.framing import frame_image
+
+    return lambda: frame_image(image)
+
+
+def case_frame_image_threads(threads: int) -> Callable[..., Callable[[], Any]]:
+    """frame_image with a fixed number of resize threads"""
+
+    def case(image: Image, workdir: Path) -> Callable[[], Any]:
+        from frame_up import framing
+
+        framing.max_resize_threads = max(framing.max_resize_threads, threads)
+        return lambda: framing.frame_image(image, threads=threads)
+
+    return case
+
+
+def case_base64_encode(image: Image, workdir: Path) -> Callable[[], Any]:
+    from frame_up.serialization import base64_encode_image
+
+    return lambda: base64_encode_image(image)
+
+
+def case_base64_decode(image: Image, workdir: Path) -> Callable[[], Any]:
+    from frame_up.serialization import base64_decode_image, base64_encode_image
+
+    text = base64_encode_image(image)
+    return lambda: base64_decode_image(text)
+
+
+def case_save_to_disk(image: Image, workdir: Path) -> Callable[[], Any]:
+    from frame_up.file import save_to_disk
+
+    path = str(workdir / "bench_save.jpg")
+    return lambda: save_to_disk(path, image)
+
+
+def case_open_from_disk(image: Image, workdir: Path) -> Callable[[], Any]:
+    from frame_up.file import open_from_disk, save_to_disk
+
+    path = str(workdir / "bench_open.jpg")
+    save_to_disk(path, image)
+
+    def run() -> None:
+        with open_from_disk(path) as opened:
+            opened.load()
+
+    return run
+
+
+def case_render_full_image(image: Image, workdir: Path) -> Callable[[], Any]:
+    from frame_up.file import save_to_disk
+    from frame_up.pipeline import render_full_image
+
+    path = str(workdir / "bench_render.jpg")
+    save_to_disk(path, image)
+    return lambda: render_full_image(path, None, 1)
+
+
+def case_get_filtered_image(image: Image, workdir: Path) -> Callable[[], Any]:
+    from frame_up import services
+
+    services.filter_cache.max_bytes = 0  # time the round trip, not the cache
+    filter = remote_cases["get_filtered_image"]
+    return lambda: services.get_filtered_image(filter, image, 1, mode="remote")
+
+
+def case_email_image(image: Image, workdir: Path) -> Callable[[], Any]:
+    from frame_up.models import ImageEmailPayload
+    from frame_up.services import email_image
+
+    payload = ImageEmailPayload(
+        to="bench@example.com", subject_line="bench", data=image
+    )
+    return lambda: email_image(payload)
+
+
+cases: dict[str, Callable[[Image, Path], Callable[[], Any]]] = {
+    "frame_image": case_frame_image,
+    **{
+        f"frame_image_{threads}t": case_frame_image_threads(threads)
+        for threads in resize_thread_counts
+    },
+    "base64_encode_image": case_base64_encode,
+    "base64_decode_image": case_base64_decode,
+    "save_to_disk": case_save_to_disk,
+    "open_from_disk": case_open_from_disk,
+    "render_full_image": case_render_full_image,
+    "get_filtered_image": case_get_filtered_image,
+    "email_image": case_email_image,
+}
+
+
+def run_case(
+    case: str, megapixels: float, repeat: int, ports: dict[str, int]
+) -> BenchResult:
+    """Runs inside a fresh worker process"""
+    from frame_up import services
+    from frame_up.standins import use_standins
+
+    use_standins(ports)
+    services.timeouts.update(standin_timeouts)
+    samples: list[float] = []
+    error = None
+
+    # the code under test prints plenty, keep the report readable
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        with tempfile.TemporaryDirectory(prefix="frame_up_bench_") as workdir:
+            image = make_image(megapixels)
+            try:
+                run = cases[case](image, Path(workdir))
+                run()  # warm up: caches, lazy loads, protocol negotiation
+
+                budget_end = time.perf_counter() + case_time_budget
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    run()
+                    samples.append(time.perf_counter() - start)
+                    if time.perf_counter() > budget_end:
+                        break
+            except Exception as e:
+                error = repr(e)
+
+    if not samples:
+        return BenchResult(
+            case, megapixels, 0, None, None, None, None, None, peak_rss_mb(), error
+        )
+    mean = sum(samples) / len(samples)
+    return BenchResult(
+        case=case,
+        megapixels=megapixels,
+        runs=len(samples),
+        mean_ms=mean * 1000,
+        p50_ms=percentile(samples, 0.50) * 1000,
+        p99_ms=percentile(samples, 0.99) * 1000,
+        ops_per_sec=1 / mean,
+        megapixels_per_sec=megapixels / mean,
+        peak_rss_mb=peak_rss_mb(),
+        error=error,
+    )
+
+
+def run_benchmarks(
+    names: Optional[list[str]] = None,
+    sizes: Optional[list[float]] = None,
+    repeat: int = default_repeat,
+    verbose: bool = True,
+) -> dict[str, Any]:
+    from frame_up.standins import start_standins, stop_standins
+
+    names = names or list(cases)
+    sizes = sizes or default_sizes
+
+    needed = [remote_cases[name] for name in names if name in remote_cases]
+    servers = start_standins(needed) if needed else {}
+    ports = {name: server.port for name, server in servers.items()}
+
+    results: list[BenchResult] = []
+    try:
+        for megapixels in sizes:
+            for name in names:
+                # one process per case, so peak RSS isn't left over from another
+                with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                    result = pool.submit(
+                        run_case, name, megapixels, repeat, ports
+                    ).result()
+                results.append(result)
+                if verbose:
+                    print(format_result(result))
+    finally:
+        stop_standins(servers)
+
+    return {
+        "version": version,
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": [asdict(result) for result in results],
+    }
+
+
+def format_result(result: BenchResult) -> str:
+    if result.error:
+        return f"[bench] {result.case} @ {result.megapixels:g} MP: ❌ {result.error}"
+    rss = f"{result.peak_rss_mb:.0f} MB" if result.peak_rss_mb is not None else "?"
+    return (
+        f"[bench] {result.case} @ {result.megapixels:g} MP: "
+        f"p50 {result.p50_ms:.1f} ms, p99 {result.p99_ms:.1f} ms, "
+        f"{result.megapixels_per_sec:.1f} MP/s, peak RSS {rss}"
+    )
+
+
+def format_speedup(report: dict[str, Any]) -> list[str]:
+    """frame_image_<n>t against frame_image_1t, per size that has both"""
+    p50 = {
+        (result["case"], result["megapixels"]): result["p50_ms"]
+        for result in report["results"]
+        if result["p50_ms"]
+    }
+    lines = []
+    for megapixels in sorted({megapixels for _, megapixels in p50}):
+        single = p50.get(("frame_image_1t", megapixels))
+        if single is None:
+            continue
+        steps = []
+        for threads in resize_thread_counts:
+            threaded = p50.get((f"frame_image_{threads}t", megapixels))
+            if threaded is not None:
+                steps.append(f"{threads}t {single / threaded:.2f}x")
+        if len(steps) > 1:
+            lines.append(
+                f"[bench] frame_image speedup @ {megapixels:g} MP: {', '.join(steps)}"
+            )
+    return lines
+
+
+def compare_to_baseline(
+    report: dict[str, Any],
+    baseline: dict[str, Any],
+    threshold: float = regression_threshold,
+) -> list[str]:
+    """
+    One message per case that got slower than `threshold` allows, or that
+    fails now but didn't in the baseline
+    """
+    before = {(r["case"], r["megapixels"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = before.get((result["case"], result["megapixels"]))
+        if old is None or old["error"]:
+            continue
+        if result["error"]:
+            regressions.append(
+                f"{result['case']} @ {result['megapixels']:g} MP: "
+                f"failed ({result['error']})"
+            )
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if result[metric] > old[metric] * (1 + threshold):
+                regressions.append(
+                    f"{result['case']} @ {result['megapixels']:g} MP: {metric} "
+                    f"{old[metric]:.1f} -> {result[metric]:.1f} "
+                    f"(+{(result[metric] / old[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+#
+#   Startup: time to first paint, in a fresh interpreter each run
+#
+
+
+def parse_importtime(output: str) -> dict[str, tuple[int, int]]:
+    """`python -X importtime` stderr -> module: (self us, cumulative us)"""
+    imports = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        imports[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return imports
+
+
+def run_startup_once() -> tuple[float, dict[str, float], dict[str, tuple[int, int]]]:
+    """(ms until the first paint as seen from here, the app's own timings, imports)"""
+    from frame_up_gui.startup import marker
+
+    command = [sys.executable, "-X", "importtime", "-m", "frame_up_gui.startup"]
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as stderr:
+        start = time.perf_counter()
+        with subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=stderr, text=True
+        ) as process:
+            assert process.stdout is not None
+            for line in process.stdout:
+                if line.startswith(marker):
+                    first_paint = (time.perf_counter() - start) * 1000
+                    timings = json.loads(line[len(marker) :])
+                    break
+            else:
+                raise RuntimeError("the app never painted, is there a display?")
+            process.stdout.read()
+        stderr.seek(0)
+        imports = parse_importtime(stderr.read())
+    return first_paint, timings, imports
+
+
+def run_startup_benchmark(
+    runs: int = default_repeat, top: int = 15, verbose: bool = True
+) -> dict[str, Any]:
+    """
+    Cold start of the GUI: process launch to first paint (p50 over `runs`),
+    the app's own breakdown, and the slowest imports by cumulative time
+    """
+    first_paints: list[float] = []
+    timings: dict[str, list[float]] = {}
+    imports: dict[str, list[tuple[int, int]]] = {}
+
+    for _ in range(runs):
+        first_paint, own, imported = run_startup_once()
+        first_paints.append(first_paint)
+        for key, value in own.items():
+            timings.setdefault(key, []).append(value)
+        for module, times in imported.items():
+            imports.setdefault(module, []).append(times)
+        if verbose:
+            print(f"[bench] startup: first paint after {first_paint:.0f} ms")
+
+    medians: list[dict[str, Any]] = [
+        {
+            "module": module,
+            "self_ms": statistics.median(t[0] for t in times) / 1000,
+            "cumulative_ms": statistics.median(t[1] for t in times) / 1000,
+        }
+        for module, times in imports.items()
+    ]
+    medians.sort(key=lambda entry: entry["cumulative_ms"], reverse=True)
+    slowest = medians[:top]
+
+    return {
+        "version": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": runs,
+        "first_paint_ms": {
+            "p50": percentile(first_paints, 0.50),
+            "min": min(first_paints),
+            "max": max(first_paints),
+        },
+        # measured inside the app, from when it started running Python code
+        "app_ms": {key: statistics.median(values) for key, values in timings.items()},
+        "slowest_imports": slowest,
+    }
+
+
+def format_startup(report: dict[str, Any]) -> str:
+    lines = [
+        f"[bench] first paint: p50 {report['first_paint_ms']['p50']:.0f} ms "
+        f"(min {report['first_paint_ms']['min']:.0f}, "
+        f"max {report['first_paint_ms']['max']:.0f}) over {report['runs']} runs",
+        "[bench] in the app: "
+        + ", ".join(f"{key} {value:.0f}" for key, value in report["app_ms"].items()),
+        "[bench] slowest imports (cumulative / self ms):",
+    ]
+    lines += [
+        f"    {entry['cumulative_ms']:8.1f} {entry['self_ms']:8.1f}  {entry['module']}"
+        for entry in report["slowest_imports"]
+    ]
+    return "\n".join(lines)
+
+
+def load_report(path: Path) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_report(path: Path, report: dict[str, Any]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
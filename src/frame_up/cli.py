@@ -0,0 +1,422 @@
+import argparse
+import json
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Optional
+
+from frame_up.constants import version
+
+
+def batch_command(args: argparse.Namespace) -> int:
+    # imported here so `frame-up --help` doesn't have to load the frame assets
+    from frame_up.batch import collect_inputs, run_batch
+
+    inputs = collect_inputs(args.sources, recursive=args.recursive)
+    if not inputs:
+        print("no images found for: ", " ".join(args.sources))
+        return 1
+
+    output_dir = Path(args.output_dir) if args.output_dir else None
+    print(f"[batch] framing {len(inputs)} images with {args.jobs or 'all'} workers")
+
+    result = run_batch(
+        inputs,
+        output_dir,
+        workers=args.jobs,
+        filter=args.filter,
+        intensity=args.intensity,
+        filter_mode=args.filter_mode,
+        preset=args.preset,
+        verbose=not args.quiet,
+    )
+
+    print(
+        f"[batch] framed {result.processed} images in {result.seconds:.2f}s "
+        f"({result.images_per_second:.1f} images/sec), {len(result.failed)} failed"
+    )
+    return 1 if result.failed else 0
+
+
+def bench_command(args: argparse.Namespace) -> int:
+    from frame_up.bench import (
+        cases,
+        compare_to_baseline,
+        format_speedup,
+        load_report,
+        run_benchmarks,
+        write_report,
+    )
+
+    unknown = [name for name in args.cases if name not in cases]
+    if unknown:
+        print("unknown benchmark: ", " ".join(unknown))
+        return 2
+
+    report = run_benchmarks(args.cases, args.sizes, args.repeat)
+    for line in format_speedup(report):
+        print(line)
+    if args.output:
+        write_report(Path(args.output), report)
+        print(f"[bench] results written to {args.output}")
+
+    if not args.baseline:
+        return 0
+
+    baseline = Path(args.baseline)
+    if args.update_baseline or not baseline.exists():
+        write_report(baseline, report)
+        print(f"[bench] saved as the new baseline: {baseline}")
+        return 0
+
+    regressions = compare_to_baseline(report, load_report(baseline), args.threshold)
+    for regression in regressions:
+        print(f"[bench] 🐢 slower than baseline: {regression}")
+    if not regressions:
+        print(f"[bench] no regressions against {baseline}")
+    return 1 if regressions else 0
+
+
+def startup_command(args: argparse.Namespace) -> int:
+    from frame_up.bench import format_startup, run_startup_benchmark, write_report
+
+    report = run_startup_benchmark(args.repeat, args.top)
+    print(format_startup(report))
+    if args.output:
+        write_report(Path(args.output), report)
+        print(f"[bench] results written to {args.output}")
+    return 0
+
+
+def standin_config(args: argparse.Namespace):
+    from frame_up.standins import StandinConfig
+
+    return StandinConfig(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        workers=args.workers,
+        seed=args.seed,
+    )
+
+
+def pack_command(args: argparse.Namespace) -> int:
+    from frame_up.assetpack import AssetPack, build_pack, default_sources
+
+    sources = default_sources()
+    if args.landscape:
+        sources["landscape"] = Path(args.landscape)
+    if args.portrait:
+        sources["portrait"] = Path(args.portrait)
+
+    start = time.perf_counter()
+    path = build_pack(args.output, sources)
+    pack = AssetPack(path)
+    print(
+        f"[pack] wrote {path} ({path.stat().st_size / 2**20:.1f} MB) "
+        f"in {(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+    for orientation, asset in pack.assets.items():
+        scales = ", ".join(f"{r['scale']:g}x" for r in asset["resolutions"])
+        print(
+            f"[pack] {orientation}: {asset['source']} {asset['size']}, "
+            f"window {asset['window']}, {scales}"
+        )
+    if args.output:
+        print(f"[pack] use it with FRAME_UP_ASSET_PACK={path}")
+    return 0
+
+
+def serve_command(args: argparse.Namespace) -> int:
+    from frame_up import services
+    from frame_up.standins import standin_services, start_standins, stop_standins
+
+    names = args.services or standin_services
+    unknown = [name for name in names if name not in standin_services]
+    if unknown:
+        print("no stand-in for: ", " ".join(unknown))
+        return 2
+
+    # the ports the app (services.service_index) talks to
+    ports = {name: int(services.service_index[name]["port"]) for name in names}
+    servers = start_standins(names, args.host, standin_config(args), ports)
+    for name, server in servers.items():
+        print(f"[serve] {name} stand-in on {server.endpoint}")
+    print("[serve] Ctrl+C to stop")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_standins(servers)
+        for name, server in servers.items():
+            print(f"[serve] {name}: {server.requests} requests, {server.errors} errors")
+    return 0
+
+
+def load_command(args: argparse.Namespace) -> int:
+    from frame_up import services
+    from frame_up.loadgen import format_load_result, run_load
+    from frame_up.standins import StandinServer, use_standins
+
+    servers: list[StandinServer] = []
+    if args.standin:
+        # replicas get spread over by the asyncio client, like a real fleet
+        config = standin_config(args)
+        servers = [
+            StandinServer(args.service, config=config).start()
+            for _ in range(args.replicas)
+        ]
+        use_standins({args.service: servers[0].port})
+        services.service_replicas[args.service] = [
+            (server.host, str(server.port)) for server in servers[1:]
+        ]
+
+    try:
+        result = run_load(
+            args.service,
+            megapixels=args.megapixels,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            total=args.requests,
+            timeout=args.timeout,
+        )
+    finally:
+        for server in servers:
+            server.stop()
+
+    print(format_load_result(result))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(asdict(result), f, indent=2)
+    return 0 if result.requests else 1
+
+
+def add_standin_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="extra ms per request (default: 0)"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="plus up to this many random ms per request (default: 0)",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of requests that fail, 0 to 1 (default: 0)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="requests a stand-in handles at the same time (default: 1)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="make latency and errors repeatable"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="frame-up", description="Put a picture frame on your images"
+    )
+    parser.add_argument("--version", action="version", version=version)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser(
+        "batch", help="frame many images at once, without the GUI"
+    )
+    batch.add_argument(
+        "sources", nargs="+", help="image files, directories or glob patterns"
+    )
+    batch.add_argument(
+        "-o",
+        "--output-dir",
+        help="where to put framed images (default: next to each source image)",
+    )
+    batch.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker processes (default: one per core)",
+    )
+    batch.add_argument(
+        "-f",
+        "--filter",
+        choices=["antique", "vibrant", "monochrome"],
+        help="apply a filter before framing",
+    )
+    batch.add_argument(
+        "-i",
+        "--intensity",
+        type=float,
+        default=1.0,
+        help="filter intensity from 0 to 1 (default: 1)",
+    )
+    batch.add_argument(
+        "--filter-mode",
+        choices=["local", "remote", "remote-with-local-fallback"],
+        default=None,
+        help="where the filter runs (default: per filter, see services.filter_modes)",
+    )
+    batch.add_argument(
+        "-p",
+        "--preset",
+        choices=["fast", "balanced", "smallest"],
+        default=None,
+        help="encoder settings, from quickest to write to smallest file "
+        "(default: balanced)",
+    )
+    batch.add_argument(
+        "-r", "--recursive", action="store_true", help="descend into subdirectories"
+    )
+    batch.add_argument(
+        "-q", "--quiet", action="store_true", help="only print the final summary"
+    )
+    batch.set_defaults(handler=batch_command)
+
+    bench = commands.add_parser(
+        "bench", help="time framing, serialization, disk and service calls"
+    )
+    bench.add_argument(
+        "cases",
+        nargs="*",
+        metavar="case",
+        help="which benchmarks to run: frame_image, frame_image_<1|2|4|8>t "
+        "(fixed resize threads), base64_encode_image, base64_decode_image, "
+        "save_to_disk, open_from_disk, render_full_image, get_filtered_image, "
+        "email_image (default: all)",
+    )
+    bench.add_argument(
+        "-s",
+        "--sizes",
+        type=float,
+        nargs="+",
+        default=None,
+        help="image sizes in megapixels (default: 1 10 100)",
+    )
+    bench.add_argument(
+        "-n", "--repeat", type=int, default=5, help="timed runs per case (default: 5)"
+    )
+    bench.add_argument("-o", "--output", help="write the results to this JSON file")
+    bench.add_argument(
+        "-b",
+        "--baseline",
+        help="JSON results to compare against, created if it doesn't exist yet",
+    )
+    bench.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="overwrite the baseline with these results instead of comparing",
+    )
+    bench.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="how much slower counts as a regression (default: 0.10, i.e. 10%%)",
+    )
+    bench.set_defaults(handler=bench_command)
+
+    startup = commands.add_parser(
+        "startup", help="time the GUI from launch to first paint, and its imports"
+    )
+    startup.add_argument(
+        "-n", "--repeat", type=int, default=5, help="cold starts to time (default: 5)"
+    )
+    startup.add_argument(
+        "--top", type=int, default=15, help="slowest imports to list (default: 15)"
+    )
+    startup.add_argument("-o", "--output", help="write the results to this JSON file")
+    startup.set_defaults(handler=startup_command)
+
+    pack = commands.add_parser(
+        "pack", help="build the pre-decoded frame asset pack workers memory-map"
+    )
+    pack.add_argument(
+        "-o",
+        "--output",
+        help="where to write it (default: the user cache, used automatically)",
+    )
+    pack.add_argument("--landscape", help="landscape frame image (default: bundled)")
+    pack.add_argument("--portrait", help="portrait frame image (default: bundled)")
+    pack.set_defaults(handler=pack_command)
+
+    serve = commands.add_parser(
+        "serve", help="run stand-in filter and email services on the usual ports"
+    )
+    serve.add_argument(
+        "services",
+        nargs="*",
+        metavar="service",
+        help="email, antique, vibrant and/or monochrome (default: all)",
+    )
+    serve.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="interface to listen on (default: 127.0.0.1)",
+    )
+    add_standin_arguments(serve)
+    serve.set_defaults(handler=serve_command)
+
+    load = commands.add_parser(
+        "load", help="load test a service and report requests/sec and latency"
+    )
+    load.add_argument("service", choices=["email", "antique", "vibrant", "monochrome"])
+    load.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=8,
+        help="requests in flight at once (default: 8)",
+    )
+    load.add_argument(
+        "-d", "--duration", type=float, default=10.0, help="seconds (default: 10)"
+    )
+    load.add_argument(
+        "-n", "--requests", type=int, default=None, help="stop after this many requests"
+    )
+    load.add_argument(
+        "-m",
+        "--megapixels",
+        type=float,
+        default=1.0,
+        help="size of the test image (default: 1)",
+    )
+    load.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="seconds per request (default: the services recv timeout)",
+    )
+    load.add_argument(
+        "--standin",
+        action="store_true",
+        help="start stand-in servers on free ports instead of using service_index",
+    )
+    load.add_argument(
+        "--replicas",
+        type=int,
+        default=1,
+        help="number of stand-in servers with --standin (default: 1)",
+    )
+    load.add_argument("-o", "--output", help="also write the result as JSON")
+    add_standin_arguments(load)
+    load.set_defaults(handler=load_command)
+
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
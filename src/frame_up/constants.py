@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # todo: make this dynamic?
@@ -6,5 +7,9 @@ version = "0.0.2"
 accepted_image_mime_types = ["image/jpeg", "image/png"]  # no "image/jpg" exists
 accepted_image_extensions = [".jpg", ".jpeg", ".png"]
 home_dir = str(Path.home())  # this is the user's home dir
+# for things we can rebuild, like the frame asset pack
+cache_dir = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "frame_up"
+)
 
 default_extension = ".jpg"
@@ -1,37 +1,415 @@
+import atexit
+import os
+import queue
+import re
+import secrets
+import stat
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any, Callable, Optional, Union
 
 from PIL import Image as im
 from PIL.Image import Image
 
 from frame_up.constants import default_extension
+from frame_up.tracing import span
 
+# pillow save() options per format, from quickest to write to smallest file
+encoder_presets: dict[str, dict[str, dict[str, Any]]] = {
+    "fast": {
+        "JPEG": {
+            "quality": 90,
+            "optimize": False,
+            "progressive": False,
+            "subsampling": 2,
+        },
+        "PNG": {"compress_level": 1},
+    },
+    "balanced": {
+        "JPEG": {
+            "quality": 90,
+            "optimize": True,
+            "progressive": False,
+            "subsampling": 2,
+        },
+        "PNG": {"compress_level": 6},
+    },
+    "smallest": {
+        "JPEG": {
+            "quality": 80,
+            "optimize": True,
+            "progressive": True,
+            "subsampling": 2,
+        },
+        "PNG": {"compress_level": 9, "optimize": True},
+    },
+}
+default_preset = "balanced"
 
-def save_to_disk(path: str, image: Image, *, format=None):
+# saves waiting for the background writer before submit() pushes back
+save_queue_size = 4
+
+# decoded pixel data one image may take while it's being opened for a given
+# size (bytes). JPEGs count at their draft size, so a big scan only costs what
+# it gets decoded at. Other formats are decoded in full before shrinking,
+# which caps them at about 170 MP (RGB). Past pillow's own hard limit
+# (2 x MAX_IMAGE_PIXELS, about 179 MP by default) nothing opens at all.
+decode_budget = 512 * 1024 * 1024
+
+
+def get_format(path: str) -> str:
+    # pillow wants a format name ("JPEG"), not an extension
+    extension = Path(path).suffix.lower() or default_extension
+    return im.registered_extensions().get(extension, "JPEG")
+
+
+def create_temp_file(path: str) -> tuple[int, str]:
+    """
+    (fd, path) of a new, empty file next to `path`. Unlike mkstemp's private
+    (0600) files it gets the mode any new file would (0666 minus the umask),
+    or the mode of the file at `path` if there is one, so replacing an image
+    keeps its permissions.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = None
+
+    directory = os.path.dirname(os.path.abspath(path))
+    while True:
+        temp_path = os.path.join(
+            directory, f".{os.path.basename(path)}.{secrets.token_hex(4)}.part"
+        )
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        break
+
+    if mode is not None:
+        try:
+            os.chmod(temp_path, mode)
+        except BaseException:
+            os.close(fd)
+            os.unlink(temp_path)
+            raise
+    return fd, temp_path
+
+
+def save_to_disk(path: str, image: Image, *, format=None, preset: Optional[str] = None):
+    """
+    Write to a temp file next to `path` and rename it into place, so a crash
+    halfway through never leaves a truncated image behind
+    """
     if format is None:
-        format = default_extension
-    print(f"Saving an image to {path} with format {format}")
-    image.save(path, format=format)
+        format = get_format(path)
+    options = encoder_presets[preset or default_preset].get(format, {})
+
+    fd, temp_path = create_temp_file(path)
+    try:
+        with span("save", path=path, format=format, preset=preset or default_preset):
+            with os.fdopen(fd, "wb") as temp:
+                image.save(temp, format=format, **options)
+                temp.flush()
+                os.fsync(temp.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class SaveQueue:
+    """
+    Saves images on a background thread, one at a time, in the order they
+    came in. At most `max_pending` saves wait in line; past that `submit`
+    blocks (or raises queue.Full with block=False) instead of piling up
+    full size images in memory.
+    """
+
+    def __init__(self, max_pending: int = save_queue_size) -> None:
+        self.jobs: queue.Queue = queue.Queue(max_pending)
+        self.pending: Counter[str] = Counter()  # same path can be queued twice
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+    def submit(
+        self,
+        path: str,
+        image: Union[Image, Callable[[], Image]],
+        *,
+        format=None,
+        preset: Optional[str] = None,
+        block: bool = True,
+    ) -> Future:
+        """
+        `image` can also be a function making the image, so rendering happens
+        on the writer thread too. The future resolves to `path`.
+        """
+        future: Future = Future()
+        key = os.path.abspath(path)
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.work, name="frame_up-save", daemon=True
+                )
+                self.thread.start()
+            self.pending[key] += 1
+        try:
+            self.jobs.put((path, image, format, preset, future), block=block)
+        except queue.Full:
+            self.done(key)
+            raise
+        return future
+
+    def work(self) -> None:
+        while True:
+            path, image, format, preset, future = self.jobs.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        if callable(image):
+                            image = image()
+                        save_to_disk(path, image, format=format, preset=preset)
+                    except Exception as e:
+                        print(f"[save] {path} failed: {e!r}")
+                        future.set_exception(e)
+                    else:
+                        future.set_result(path)
+            finally:
+                self.done(os.path.abspath(path))
+                self.jobs.task_done()
+
+    def done(self, key: str) -> None:
+        with self.lock:
+            self.pending[key] -= 1
+            if self.pending[key] <= 0:
+                del self.pending[key]
+
+    def is_pending(self, path: Union[str, Path]) -> bool:
+        """Queued or being written right now"""
+        with self.lock:
+            return os.path.abspath(path) in self.pending
+
+    def pending_in(self, directory: str) -> set[str]:
+        """normcased names of the queued saves going into `directory`"""
+        with self.lock:
+            return {
+                os.path.normcase(os.path.basename(path))
+                for path in self.pending
+                if os.path.dirname(path) == directory
+            }
+
+    def join(self) -> None:
+        """Wait for every queued save to hit the disk"""
+        self.jobs.join()
+
+
+save_queue = SaveQueue()
+atexit.register(save_queue.join)
 
 
 def open_from_disk(path: str) -> Image:
     return im.open(path)
 
 
+def open_image(path: str) -> Image:
+    """
+    im.open (header only), for callers that check the decoded size against
+    decode_budget themselves. Images pillow refuses as decompression bombs
+    raise ValueError, same as ones over the budget.
+
+    Pillow's DecompressionBombWarning (between 1 and 2 x MAX_IMAGE_PIXELS) is
+    left alone: turning it off means changing pillow's or the warnings
+    module's globals, for every other thread too.
+    """
+    try:
+        return im.open(path)
+    except im.DecompressionBombError as e:
+        raise ValueError(f"{path} is too big to open: {e}") from e
+
+
+def open_for_size(
+    path: str, size: tuple[int, int], budget: Optional[int] = None
+) -> Image:
+    """
+    Open a reduced resolution copy that still covers `size`.
+    JPEGs get decoded at 1/2, 1/4 or 1/8 scale (draft mode),
+    everything else is decoded and then shrunk by an integer factor.
+    Raises ValueError if decoding would take more than `budget` bytes
+    (decode_budget if None) instead of trying anyway.
+    """
+    if size[0] < 1 or size[1] < 1:
+        raise ValueError(f"Can't open {path} for an empty size {size}")
+    budget = decode_budget if budget is None else budget
+    with span("decode", path=path, size=size):
+        image = open_image(path)
+        image.draft(image.mode, size)  # no-op for anything but JPEG
+
+        # the draft shrinks image.size, so this is what load() will hold
+        factor = min(image.width // size[0], image.height // size[1])
+        nbytes = image.width * image.height * len(image.getbands())
+        if factor > 1:
+            nbytes += nbytes // (factor * factor)
+        if nbytes > budget:
+            image.close()
+            raise ValueError(
+                f"{path} needs {nbytes // 2**20} MB to decode, "
+                f"over the {budget // 2**20} MB budget"
+            )
+
+        if factor > 1:
+            return image.reduce(factor)
+
+        image.load()
+        return image
+
+
+#
+#   Output names: photo.jpg -> photo_framed_0.jpg -> photo_framed_1.jpg ...
+#
+
+framed_name = re.compile(r"(.*)_framed_(\d+)")
+
+
+@dataclass
+class DirectoryIndex:
+    """What one scan of a directory found, see get_directory_index"""
+
+    stamp: Optional[int]  # directory mtime when scanned, None if it didn't exist
+    names: set[str] = field(default_factory=set)
+    # (base name, extension) -> N of every base_framed_N.ext
+    indices: dict[tuple[str, str], set[int]] = field(default_factory=dict)
+
+    def add(self, name: str) -> None:
+        name = os.path.normcase(name)
+        self.names.add(name)
+        stem, ext = os.path.splitext(name)
+        match = framed_name.fullmatch(stem)
+        if match:
+            self.indices.setdefault((match[1], ext), set()).add(int(match[2]))
+
+
+# directories scanned recently, least recently used first
+directory_cache_size = 32
+directory_cache: OrderedDict[str, DirectoryIndex] = OrderedDict()
+_directory_lock = threading.Lock()
+
+
+def get_directory_stamp(directory: str) -> Optional[int]:
+    try:
+        return os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_directory_index(directory: str) -> DirectoryIndex:
+    """
+    Names in `directory`, from one scandir. Cached until the directory's
+    mtime changes, so a repeat lookup costs a single stat.
+    Call with _directory_lock held.
+    """
+    stamp = get_directory_stamp(directory)
+    index = directory_cache.get(directory)
+    if index is not None and index.stamp == stamp:
+        directory_cache.move_to_end(directory)
+        return index
+
+    index = DirectoryIndex(stamp)
+    if stamp is not None:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                index.add(entry.name)
+
+    directory_cache[directory] = index
+    directory_cache.move_to_end(directory)
+    if len(directory_cache) > directory_cache_size:
+        directory_cache.popitem(last=False)
+    return index
+
+
+def invalidate_directory(directory: Optional[Path] = None) -> None:
+    """Forget one directory's scan (or all of them), e.g. after deleting files"""
+    with _directory_lock:
+        if directory is None:
+            directory_cache.clear()
+        else:
+            directory_cache.pop(os.path.abspath(directory), None)
+
+
 def get_suggested_filepath(directory: Path, filename: str) -> Path:
-    path = directory / filename
+    """
+    `filename` if it's free, otherwise the first free name_framed_N after it.
+    Only a suggestion: use reserve_filepath when something else may be
+    picking names in the same directory at the same time.
+    """
+    with _directory_lock:
+        return directory / suggest_name(os.path.abspath(directory), filename)
 
-    if path.exists() and path.is_file():
-        name, ext = filename.rsplit(".", maxsplit=1)
-        try:
-            # is it in this program's format?
-            name, middle, idx = name.rsplit("_", maxsplit=2)
-            if middle != "framed":
-                raise ValueError("middle portion is actually ", middle)
-            idx = str(int(idx) + 1)
-        except ValueError as e:
-            print(e)
-            # may not have been in initial format
-            idx = "0"
-        return get_suggested_filepath(directory, f"{name}_framed_{idx}.{ext}")
-
-    return path
+
+def suggest_name(directory: str, filename: str) -> str:
+    index = get_directory_index(directory)
+    # a save still in the queue counts as taken
+    pending = save_queue.pending_in(directory)
+
+    def taken(name: str) -> bool:
+        name = os.path.normcase(name)
+        return name in index.names or name in pending
+
+    def free_on_disk(name: str) -> bool:
+        """
+        Free as far as the scan knows, but directory mtimes can be coarse
+        enough (a second or two on some filesystems) to miss a file made just
+        after it. One stat confirms it before anyone gets the name.
+        """
+        if not os.path.lexists(os.path.join(directory, name)):
+            return True
+        index.add(name)
+        return False
+
+    if not taken(filename) and free_on_disk(filename):
+        return filename
+
+    stem, ext = os.path.splitext(filename)
+    # is it in this program's format already? then count on from there
+    match = framed_name.fullmatch(stem)
+    base, idx = (match[1], int(match[2]) + 1) if match else (stem, 0)
+
+    used = index.indices.get((os.path.normcase(base), os.path.normcase(ext)), set())
+    while True:
+        name = f"{base}_framed_{idx}{ext}"
+        if idx not in used and not taken(name) and free_on_disk(name):
+            return name
+        idx += 1
+
+
+def reserve_filepath(directory: Path, filename: str) -> Path:
+    """
+    Like get_suggested_filepath, but claims the name by creating an empty
+    file there (exclusive create), so two processes can never both get it.
+    Whatever is saved to the path later simply replaces the placeholder.
+    """
+    directory = Path(directory)
+    key = os.path.abspath(directory)
+    with _directory_lock:
+        while True:
+            name = suggest_name(key, filename)
+            try:
+                with open(directory / name, "xb"):
+                    pass
+            except FileExistsError:
+                # someone else got there since the scan
+                directory_cache.pop(key, None)
+                continue
+
+            # we know what changed, no need to rescan for our own placeholder
+            # (anything else racing us is still caught by the exclusive create)
+            index = directory_cache[key]
+            index.add(name)
+            index.stamp = get_directory_stamp(key)
+            return directory / name
@@ -0,0 +1,89 @@
+"""
+In-process versions of the filter microservices.
+
+Same contract as the remote ones: an intensity of 0 leaves the image alone,
+1 is the full effect, and everything in between is a linear blend.
+"""
+
+from typing import Callable, Optional
+
+from PIL import Image as im
+from PIL import ImageEnhance, ImageOps
+from PIL.Image import Image
+
+# sepia-ish toning for the antique look
+antique_palette = {
+    "black": (38, 26, 13),
+    "mid": (150, 112, 70),
+    "white": (255, 240, 212),
+}
+
+# saturation multiplier at full vibrant intensity
+vibrant_saturation = 2.0
+vibrant_contrast = 1.15
+
+
+def split_alpha(image: Image) -> tuple[Image, Optional[Image]]:
+    """RGB copy of the image plus its alpha band (if it had one)"""
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        rgba = image.convert("RGBA")
+        return rgba.convert("RGB"), rgba.getchannel("A")
+    if image.mode != "RGB":
+        return image.convert("RGB"), None
+    return image, None
+
+
+def merge_alpha(image: Image, alpha: Optional[Image]) -> Image:
+    if alpha is None:
+        return image
+    image = image.convert("RGBA")
+    image.putalpha(alpha)
+    return image
+
+
+def clamp_intensity(intensity: float) -> float:
+    return min(max(float(intensity), 0.0), 1.0)
+
+
+def blend(original: Image, effect: Image, intensity: float) -> Image:
+    """Linear mix from `original` (0) to `effect` (1)"""
+    intensity = clamp_intensity(intensity)
+    if intensity == 0:
+        return original
+    if intensity == 1:
+        return effect
+    if original.mode != effect.mode:
+        original = original.convert(effect.mode)
+    return im.blend(original, effect, intensity)
+
+
+def antique_filter(image: Image, intensity: float = 1) -> Image:
+    rgb, alpha = split_alpha(image)
+    toned = ImageOps.colorize(
+        ImageOps.grayscale(rgb),
+        black=antique_palette["black"],
+        white=antique_palette["white"],
+        mid=antique_palette["mid"],
+    )
+    faded = ImageEnhance.Contrast(toned).enhance(0.85)
+    return merge_alpha(blend(rgb, faded, intensity), alpha)
+
+
+def vibrant_filter(image: Image, intensity: float = 1) -> Image:
+    rgb, alpha = split_alpha(image)
+    effect = ImageEnhance.Color(rgb).enhance(vibrant_saturation)
+    effect = ImageEnhance.Contrast(effect).enhance(vibrant_contrast)
+    return merge_alpha(blend(rgb, effect, intensity), alpha)
+
+
+def monochrome_filter(image: Image, intensity: float = 1) -> Image:
+    rgb, alpha = split_alpha(image)
+    gray = ImageOps.grayscale(rgb).convert("RGB")
+    return merge_alpha(blend(rgb, gray, intensity), alpha)
+
+
+local_filters: dict[str, Callable[[Image, float], Image]] = {
+    "antique": antique_filter,
+    "vibrant": vibrant_filter,
+    "monochrome": monochrome_filter,
+}
@@ -1,46 +1,533 @@
-from importlib.resources import as_file, files
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from importlib.resources import files
+from threading import RLock
+from typing import Literal, Optional, Union
 
 from PIL import Image as im
+from PIL import ImageChops, ImageFilter, ImageStat
 from PIL.Image import Image
 
-border_width = 115
-
+from frame_up import assetpack
+from frame_up.tracing import span, traced
 
 """
 add this attribution:
 <a href="https://www.freepik.com/free-photo/old-wooden-frame_976276.htm#fromView=search&page=1&position=1&uuid=549f4e90-bea4-4bf8-a892-ac3baadb811b">Image by mrsiraphol on Freepik</a>
 """
 
+frame_files = {"portrait": "portrait.jpeg", "landscape": "landscape.jpeg"}
+
+# a frame asset's window is the white hole in its middle (or the transparent
+# one, for assets with alpha): every channel at least this counts as white
+window_threshold = 200
+
+# how the edges fill the frame's length: "stretch" the asset's edge or "tile" it
+edge_mode = "stretch"
+
+# upper bound for the pixel data held by scaled frame borders (bytes)
+template_cache_limit = 64 * 1024 * 1024
+
+# framed images come out in this mode whatever the assets are stored as
+frame_mode = "RGB"
+
+# decoded on first use, not at import (and not at all with an asset pack)
 frames: dict[str, Image] = {}
-for file in files("frame_up.data").iterdir():
-    if file.is_file():
-        print("Opening ", file.name)
-        img_bytes = file.open("rb")
-        image = im.open(img_bytes)
-        frames[file.name] = image
+
+# orientation -> (asset with the frame's alpha, FrameGeometry), see load_masked_frame
+masked_frames: dict[str, tuple[Image, "FrameGeometry"]] = {}
+
+# see get_pack, False until we looked for one
+pack: Union[assetpack.AssetPack, None, Literal[False]] = False
+
+# (orientation, (width, height)) -> border pieces already scaled to that size
+templates: OrderedDict[tuple[str, tuple[int, int]], "Border"] = OrderedDict()
+templates_nbytes = 0
+
+# resizing works in horizontal bands so its scratch space stays around this
+# (bytes) no matter how big the source is. Bands join up seamlessly.
+resize_band_bytes = 16 * 1024 * 1024
+
+# bands can be resized on several threads (pillow lets go of the GIL while it
+# resamples): one thread per this many source pixels, up to max_resize_threads
+pixels_per_resize_thread = 4_000_000
+max_resize_threads = os.cpu_count() or 1
+_resize_pool: Optional[ThreadPoolExecutor] = None
+
+_lock = RLock()  # GUI worker threads frame images too
+
+
+def image_nbytes(image: Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+def get_orientation(img: Image) -> str:
+    return orientation_for(img.size)
+
+
+def orientation_for(size: tuple[int, int]) -> str:
+    return "landscape" if size[0] > size[1] else "portrait"
+
+
+def load_frame(orientation: str) -> Image:
+    """Decode a frame asset the first time it's asked for"""
+    name = frame_files[orientation]
+    with _lock:
+        frame = frames.get(name)
+        if frame is None:
+            asset = files("frame_up.data").joinpath(name)
+            with span("frame.load_asset", asset=name), asset.open("rb") as img_bytes:
+                frame = im.open(img_bytes)
+                frame.load()  # decode before the file closes
+            frames[name] = frame
+        return frame
+
+
+def get_pack() -> Optional[assetpack.AssetPack]:
+    """The asset pack, looked for once per process (see frame_up.assetpack)"""
+    global pack
+    with _lock:
+        if pack is False:
+            with span("frame.load_pack"):
+                pack = assetpack.load_pack()
+        return pack or None
+
+
+#
+#   Where the window is: measured once per asset (and kept in the asset pack)
+#
+
+
+@dataclass
+class FrameGeometry:
+    """Where a frame asset's window is, in the asset's pixels"""
+
+    size: tuple[int, int]
+    # bounding box of the window, the picture gets resized to fill this
+    window: tuple[int, int, int, int]
+    # biggest rectangle that's all window, slices get cut along it
+    inner_box: tuple[int, int, int, int]
+
+    @property
+    def borders(self) -> tuple[int, int, int, int]:
+        """left, top, right, bottom: the frame around inner_box"""
+        left, up, right, down = self.inner_box
+        return (left, up, self.size[0] - right, self.size[1] - down)
+
+
+def find_window(frame: Image) -> tuple[Image, FrameGeometry]:
+    """
+    Measure the asset's window. Returns the frame's alpha (0 in the window,
+    255 on the frame) and the geometry.
+    """
+    if "A" in frame.getbands():
+        window = frame.getchannel("A").point(lambda a: 255 if a < 128 else 0)
     else:
-        print("what is this?: ", file.name)
+        red, green, blue = frame.convert("RGB").split()
+        darkest = ImageChops.darker(ImageChops.darker(red, green), blue)
+        window = darkest.point(lambda v: 255 if v >= window_threshold else 0)
+    # a pixel more, to cover the whitish fringe along the frame's inner edge
+    window = window.filter(ImageFilter.MaxFilter(3))
+
+    # the rows and columns through the middle that are mostly window, so a
+    # stray white patch on the frame doesn't count
+    width, height = frame.size
+    rows = window.resize((1, height), im.Resampling.BOX).tobytes()
+    columns = window.resize((width, 1), im.Resampling.BOX).tobytes()
+
+    def around_middle(coverage: bytes) -> tuple[int, int]:
+        start = end = len(coverage) // 2
+        while start > 0 and coverage[start - 1] > 25:
+            start -= 1
+        while end < len(coverage) and coverage[end] > 25:
+            end += 1
+        return start, end
+
+    left, right = around_middle(columns)
+    up, down = around_middle(rows)
+    if right - left < 2 or down - up < 2:
+        raise ValueError("No window found in the middle of the frame")
+    only_window = im.new("L", frame.size, 0)
+    only_window.paste(window.crop((left, up, right, down)), (left, up))
+    bbox = only_window.getbbox()
+    assert bbox is not None
+
+    # shrink the box, worst side first, until it's window all the way round
+    inner = list(bbox)
+    while inner[2] - inner[0] > 1 and inner[3] - inner[1] > 1:
+        x0, y0, x1, y1 = inner
+        sides = [
+            (x0, y0, x0 + 1, y1),
+            (x0, y0, x1, y0 + 1),
+            (x1 - 1, y0, x1, y1),
+            (x0, y1 - 1, x1, y1),
+        ]
+        means = [ImageStat.Stat(only_window.crop(side)).mean[0] for side in sides]
+        worst = min(range(4), key=means.__getitem__)
+        if means[worst] >= 255:
+            break
+        inner[worst] += 1 if worst < 2 else -1
+
+    alpha = ImageChops.invert(only_window)
+    geometry = FrameGeometry(frame.size, bbox, tuple(inner))  # type: ignore
+    return alpha, geometry
+
+
+def load_masked_frame(orientation: str) -> tuple[Image, FrameGeometry]:
+    """The decoded asset as RGBA, with the window see-through, and its geometry"""
+    with _lock:
+        masked = masked_frames.get(orientation)
+        if masked is None:
+            frame = load_frame(orientation)
+            with span("frame.find_window", orientation=orientation):
+                alpha, geometry = find_window(frame)
+            rgba = frame.convert("RGBA")
+            rgba.putalpha(alpha)
+            masked = masked_frames[orientation] = (rgba, geometry)
+        return masked
+
+
+def get_geometry(orientation: str) -> FrameGeometry:
+    loaded = get_pack()
+    if loaded is not None:
+        asset = loaded.assets[orientation]
+        return FrameGeometry(
+            tuple(asset["size"]),
+            tuple(asset["window"]),
+            tuple(asset["inner_box"]),
+        )
+    return load_masked_frame(orientation)[1]
+
+
+#
+#   9-slice frames: the asset's corners stay as they are, its edges get
+#   stretched (or tiled) to any length, and the middle is all photo.
+#
+
+
+corner_names = ["top_left", "top_right", "bottom_left", "bottom_right"]
+edge_names = ["top", "bottom", "left", "right"]
+
+Borders = tuple[int, int, int, int]  # left, top, right, bottom
+
+
+@dataclass
+class FrameSlices:
+    """A frame asset (RGBA, see load_masked_frame) cut into corners and edges"""
 
+    borders: Borders  # thickness in the asset (pixels)
+    corners: dict[str, Image]  # top_left, top_right, bottom_left, bottom_right
+    edges: dict[str, Image]  # top, bottom (horizontal), left, right (vertical)
 
-def frame_image(img: Image) -> Image:
-    frame = frames["portrait.jpeg"]
-    if img.width > img.height:
-        frame = frames["landscape.jpeg"]
 
-    # copy so we don't mutate the original
-    frame = frame.copy()
+# (orientation, scale) -> slices, cut on first use
+slices: dict[tuple[str, float], FrameSlices] = {}
 
-    # get inner dimensions
-    up = 0 + border_width
-    left = 0 + border_width
-    right = frame.width - border_width
-    down = frame.height - border_width
+# scaled corners and edges with where they go, for one frame size
+Border = list[tuple[Image, tuple[int, int]]]
 
-    # paste incoming image into the frame
-    resized = img.resize((right - left, down - up))
 
-    # probably needs lower right as well
-    # or get avg width of frame and add to UL, sub from BR
-    frame.paste(resized, box=(up, left))
+def cut_slices(frame: Image, borders: Borders) -> FrameSlices:
+    width, height = frame.size
+    left, top, right, bottom = borders
+    return FrameSlices(
+        borders=borders,
+        corners={
+            "top_left": frame.crop((0, 0, left, top)),
+            "top_right": frame.crop((width - right, 0, width, top)),
+            "bottom_left": frame.crop((0, height - bottom, left, height)),
+            "bottom_right": frame.crop((width - right, height - bottom, width, height)),
+        },
+        edges={
+            "top": frame.crop((left, 0, width - right, top)),
+            "bottom": frame.crop((left, height - bottom, width - right, height)),
+            "left": frame.crop((0, top, left, height - bottom)),
+            "right": frame.crop((width - right, top, width, height - bottom)),
+        },
+    )
+
+
+def get_slices(orientation: str, scale: float = 0) -> FrameSlices:
+    """
+    Slices to draw a border at `scale` from: the smallest resolution in the
+    asset pack that's at least that big, or the decoded asset itself
+    """
+    loaded = get_pack()
+    with _lock:
+        if loaded is None:
+            key = (orientation, 1.0)
+            cut = slices.get(key)
+            if cut is None:
+                frame, geometry = load_masked_frame(orientation)
+                cut = slices[key] = cut_slices(frame, geometry.borders)
+            return cut
+
+        resolution = loaded.resolution(orientation, scale)
+        key = (orientation, resolution["scale"])
+        cut = slices.get(key)
+        if cut is None:
+            pieces = {
+                name: loaded.piece(resolution, name) for name in resolution["pieces"]
+            }
+            cut = slices[key] = FrameSlices(
+                borders=tuple(resolution["borders"]),  # type: ignore
+                corners={name: pieces[name] for name in corner_names},
+                edges={name: pieces[name] for name in edge_names},
+            )
+        return cut
+
+
+def frame_scale(orientation: str, size: tuple[int, int]) -> float:
+    """
+    The asset's scale in a frame of `size`: that of the side closest to it,
+    but never above 1. Frames bigger than the asset get a longer border,
+    not a thicker (and blurry, upscaled) one.
+    """
+    width, height = get_geometry(orientation).size
+    return min(max(size[0] / width, size[1] / height), 1.0)
+
+
+def scaled_borders(orientation: str, size: tuple[int, int]) -> Borders:
+    """Borders for a frame of `size`. Always leaves some window."""
+    scale = frame_scale(orientation, size)
+    left, top, right, bottom = (
+        round(border * scale) for border in get_geometry(orientation).borders
+    )
+    # tiny frames: give up border before the window disappears
+    while left + right >= size[0] and (left or right):
+        left, right = max(0, left - 1), max(0, right - 1)
+    while top + bottom >= size[1] and (top or bottom):
+        top, bottom = max(0, top - 1), max(0, bottom - 1)
+    return (left, top, right, bottom)
+
+
+def fit_frame_size(
+    image_size: tuple[int, int], bounds: Optional[tuple[int, int]] = None
+) -> tuple[int, int]:
+    """
+    Frame size for an image of `image_size`: the window has the image's
+    aspect ratio, and the frame fits in `bounds` (the asset's size if None)
+    without upscaling the asset. Images too thin for that (narrower than a
+    pixel of window) get a 1 pixel window, stretched as far as it fits.
+    """
+    geometry = get_geometry(orientation_for(image_size))
+    asset_width, asset_height = geometry.size
+    bounds = bounds or geometry.size
+    scale = min(bounds[0] / asset_width, bounds[1] / asset_height, 1.0)
+
+    # biggest window with the image's aspect that fits the scaled asset's
+    left, up, right, down = geometry.window
+    most_width, most_height = (right - left) * scale, (down - up) * scale
+    aspect = image_size[0] / image_size[1]
+    width = max(1, min(most_width, most_height * aspect))
+    # the window can't get thinner than a pixel, so very tall images don't
+    # keep their aspect, or this would go past most_height
+    height = min(most_height, max(1, width / aspect))
+    extra_width = (asset_width - (right - left)) * scale
+    extra_height = (asset_height - (down - up)) * scale
+    return (round(width + extra_width), round(height + extra_height))
+
+
+def inner_box(size: tuple[int, int]) -> tuple[int, int, int, int]:
+    """(left, up, right, down) of the picture window for a frame of `size`"""
+    orientation = orientation_for(size)
+    geometry = get_geometry(orientation)
+    scale = frame_scale(orientation, size)
+    left, top, right, bottom = scaled_borders(orientation, size)
+
+    # the window reaches a little past the inner box, wherever it isn't square
+    window, inner = geometry.window, geometry.inner_box
+    return (
+        max(0, left - round((inner[0] - window[0]) * scale)),
+        max(0, top - round((inner[1] - window[1]) * scale)),
+        min(size[0], size[0] - right + round((window[2] - inner[2]) * scale)),
+        min(size[1], size[1] - bottom + round((window[3] - inner[3]) * scale)),
+    )
+
+
+def cover_box(
+    image_size: tuple[int, int], size: tuple[int, int]
+) -> tuple[float, float, float, float]:
+    """The middle part of an image that has the aspect ratio of `size`"""
+    width, height = image_size
+    scale = min(width / size[0], height / size[1])
+    # min() as float rounding can come out a hair over the image
+    crop_width, crop_height = min(size[0] * scale, width), min(size[1] * scale, height)
+    left, up = (width - crop_width) / 2, (height - crop_height) / 2
+    return (left, up, left + crop_width, up + crop_height)
+
+
+def fill_edge(edge: Image, size: tuple[int, int], horizontal: bool) -> Image:
+    """`edge` made `size`: stretched, or scaled across and tiled along (edge_mode)"""
+    if edge_mode != "tile":
+        return edge.resize(size)
+
+    if horizontal:
+        step = max(1, round(edge.width * size[1] / edge.height))
+        tile = edge.resize((step, size[1]))
+    else:
+        step = max(1, round(edge.height * size[0] / edge.width))
+        tile = edge.resize((size[0], step))
+    # centered, so an ornament in the middle of the edge stays in the middle
+    length = size[0] if horizontal else size[1]
+    start = (length - step) // 2
+    start -= -(-start // step) * step  # back up to the first one in view
+    filled = im.new(edge.mode, size)
+    for offset in range(start, length, step):
+        filled.paste(tile, (offset, 0) if horizontal else (0, offset))
+    return filled
+
+
+def render_border(orientation: str, size: tuple[int, int]) -> Border:
+    width, height = size
+    left, top, right, bottom = scaled_borders(orientation, size)
+    cut = get_slices(orientation, frame_scale(orientation, size))
+    across, down = width - left - right, height - top - bottom
+
+    border: Border = []
+    corners = [
+        ("top_left", (left, top), (0, 0)),
+        ("top_right", (right, top), (width - right, 0)),
+        ("bottom_left", (left, bottom), (0, height - bottom)),
+        ("bottom_right", (right, bottom), (width - right, height - bottom)),
+    ]
+    for name, corner_size, position in corners:
+        if corner_size[0] and corner_size[1]:
+            border.append((cut.corners[name].resize(corner_size), position))
+    edges = [
+        ("top", (across, top), (left, 0), True),
+        ("bottom", (across, bottom), (left, height - bottom), True),
+        ("left", (left, down), (0, top), False),
+        ("right", (right, down), (width - right, top), False),
+    ]
+    for name, edge_size, position, horizontal in edges:
+        if edge_size[0] and edge_size[1]:
+            border.append((fill_edge(cut.edges[name], edge_size, horizontal), position))
+    return border
+
+
+def get_border(orientation: str, size: tuple[int, int]) -> Border:
+    """
+    The frame's corners and edges for `size` (RGBA, see-through where the
+    window is), cached. Treat the images as read-only, they're shared with
+    later calls.
+    """
+    global templates_nbytes
+
+    with _lock:
+        key = (orientation, size)
+        border = templates.get(key)
+        if border is not None:
+            templates.move_to_end(key)
+            return border
+
+        border = render_border(orientation, size)
+        templates[key] = border
+        templates_nbytes += sum(image_nbytes(piece) for piece, _ in border)
+
+        # evict least recently used, but keep the one we just made
+        while templates_nbytes > template_cache_limit and len(templates) > 1:
+            _, evicted = templates.popitem(last=False)
+            templates_nbytes -= sum(image_nbytes(piece) for piece, _ in evicted)
+
+        return border
+
+
+def clear_template_cache() -> None:
+    global templates_nbytes
+    with _lock:
+        templates.clear()
+        templates_nbytes = 0
+
+
+@traced("frame")
+def frame_image(
+    img: Image, size: Optional[tuple[int, int]] = None, threads: Optional[int] = None
+) -> Image:
+    """
+    Frame `img`. The result is `size` if given, else fit_frame_size for the
+    image. The image keeps its aspect ratio: if `size` doesn't match it, the
+    middle part that does is what ends up in the window.
+    `threads` for the resize, picked by image size if None.
+    """
+    size = size or fit_frame_size(img.size)
+    orientation = orientation_for(size)
+
+    # picture first, then the frame over it through the frame's alpha, so
+    # whatever shape the window has is all that shows of the picture
+    frame = im.new(frame_mode, size)
+    left, up, right, down = inner_box(size)
+    source = cover_box(img.size, (right - left, down - up))
+    resize_into(frame, img, (left, up, right, down), threads, source)
+
+    for piece, position in get_border(orientation, size):
+        frame.paste(piece, position, piece)
 
     return frame
+
+
+def resize_threads(img: Image) -> int:
+    """How many threads a resize of `img` is worth"""
+    wanted = img.width * img.height // pixels_per_resize_thread
+    return max(1, min(max_resize_threads, wanted))
+
+
+def get_resize_pool() -> ThreadPoolExecutor:
+    global _resize_pool
+    with _lock:
+        if _resize_pool is None:
+            _resize_pool = ThreadPoolExecutor(
+                max_resize_threads, thread_name_prefix="frame_up-resize"
+            )
+        return _resize_pool
+
+
+def resize_into(
+    frame: Image,
+    img: Image,
+    box: tuple[int, int, int, int],
+    threads: Optional[int] = None,
+    source: Optional[tuple[float, float, float, float]] = None,
+) -> None:
+    """
+    Resize `source` of `img` (all of it if None) to fill `box` of `frame`,
+    a band of rows at a time. Each band resamples from its own slice of the
+    source with the same scale as one big resize would, so however the rows
+    get split up (and on however many threads) the result is within a level
+    of rounding of it.
+    """
+    left, up, right, down = box
+    width, height = right - left, down - up
+    src_left, src_up, src_right, src_down = source or (0, 0, img.width, img.height)
+    threads = resize_threads(img) if threads is None else max(1, threads)
+
+    # pillow resamples rows first: out width x source rows per band
+    scale = (src_down - src_up) / height
+    row_bytes = width * len(img.getbands()) * max(scale, 1)
+    rows = max(1, int(resize_band_bytes // row_bytes))
+    rows = min(rows, -(-height // threads))  # at least one band per thread
+    if rows >= height:
+        whole = (src_left, src_up, src_right, src_down)
+        frame.paste(img.resize((width, height), box=whole), box=(left, up))
+        return
+
+    img.load()  # once, before the threads all want it
+
+    def resize_band(top: int) -> None:
+        bottom = min(top + rows, height)
+        band = img.resize(
+            (width, bottom - top),
+            box=(src_left, src_up + top * scale, src_right, src_up + bottom * scale),
+        )
+        # bands don't overlap, so pasting them side by side is fine
+        frame.paste(band, box=(left, up + top))
+
+    tops = range(0, height, rows)
+    if threads == 1:
+        for top in tops:
+            resize_band(top)
+    else:
+        # list() to re-raise whatever a band ran into
+        list(get_resize_pool().map(resize_band, tops))
@@ -0,0 +1,158 @@
+"""
+Load generator for the filter and email services.
+
+Drives a service through the real asyncio client (frame_up.async_services)
+with a fixed number of requests in flight, and reports sustained
+requests/sec and tail latency. Point it at the real fleet, or let it start
+stand-ins (frame_up.standins) to see how latency, errors and worker count
+play out.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import redirect_stdout
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from PIL.Image import Image
+
+from frame_up import async_services, services
+from frame_up.bench import make_image, percentile
+from frame_up.models import ImageEmailPayload
+
+
+@dataclass
+class LoadResult:
+    service: str
+    concurrency: int
+    seconds: float
+    requests: int  # successful ones
+    errors: int
+    requests_per_second: float
+    # latency of the successful requests, None if there weren't any
+    p50_ms: Optional[float]
+    p90_ms: Optional[float]
+    p99_ms: Optional[float]
+    max_ms: Optional[float]
+
+
+def make_request(
+    service: str, image: Image, timeout: Optional[float]
+) -> Callable[[], Any]:
+    """A coroutine function doing one request, same as the app would"""
+    if service == "email":
+        payload = ImageEmailPayload(
+            to="load@example.com", subject_line="load", data=image
+        )
+        return lambda: async_services.email_image_async(payload, timeout=timeout)
+    return lambda: async_services.get_remote_filtered_image_async(
+        service, image, 1, timeout=timeout
+    )
+
+
+async def generate_load(
+    service: str,
+    image: Image,
+    *,
+    concurrency: int = 8,
+    duration: float = 10.0,
+    total: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> LoadResult:
+    """
+    Keep `concurrency` requests in flight for `duration` seconds (or until
+    `total` requests went out, whichever comes first)
+    """
+    request = make_request(service, image, timeout)
+    latencies: list[float] = []
+    errors = 0
+    issued = 0
+
+    # the first request settles the protocol, keep it out of the numbers
+    try:
+        await request()
+    except Exception as e:
+        print(f"[load] warm up request failed: {e!r}")
+
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def worker() -> None:
+        nonlocal errors, issued
+        while time.perf_counter() < deadline and (total is None or issued < total):
+            issued += 1
+            sent = time.perf_counter()
+            try:
+                await request()
+            except Exception:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - sent)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        async_services.close_pool()
+    seconds = time.perf_counter() - start
+
+    def ms(fraction: float) -> Optional[float]:
+        return percentile(latencies, fraction) * 1000 if latencies else None
+
+    return LoadResult(
+        service=service,
+        concurrency=concurrency,
+        seconds=seconds,
+        requests=len(latencies),
+        errors=errors,
+        requests_per_second=len(latencies) / seconds,
+        p50_ms=ms(0.50),
+        p90_ms=ms(0.90),
+        p99_ms=ms(0.99),
+        max_ms=ms(1.0),
+    )
+
+
+def run_load(
+    service: str,
+    *,
+    megapixels: float = 1.0,
+    concurrency: int = 8,
+    duration: float = 10.0,
+    total: Optional[int] = None,
+    timeout: Optional[float] = None,
+    quiet: bool = True,
+) -> LoadResult:
+    """Blocking wrapper, uses whatever services.service_index points at"""
+    if service not in services.service_index:
+        raise ValueError("Unknown service: ", service)
+    image = make_image(megapixels)
+
+    async def main() -> LoadResult:
+        return await generate_load(
+            service,
+            image,
+            concurrency=concurrency,
+            duration=duration,
+            total=total,
+            timeout=timeout,
+        )
+
+    if not quiet:
+        return asyncio.run(main())
+    # the client logs every request, which would swamp the report (and the CPU)
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        return asyncio.run(main())
+
+
+def format_load_result(result: LoadResult) -> str:
+    def ms(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.1f} ms"
+
+    return (
+        f"[load] {result.service}: {result.requests_per_second:.1f} req/s sustained "
+        f"over {result.seconds:.1f}s with {result.concurrency} in flight, "
+        f"{result.requests} ok / {result.errors} failed\n"
+        f"[load] latency p50 {ms(result.p50_ms)}, p90 {ms(result.p90_ms)}, "
+        f"p99 {ms(result.p99_ms)}, max {ms(result.max_ms)}"
+    )
@@ -1,9 +1,10 @@
 import json
 from dataclasses import dataclass
+from typing import Any, Optional
 
 from PIL.Image import Image
 
-from frame_up.serialization import base64_encode_image
+from frame_up.serialization import Buffer, base64_encode_image, pack_frames
 
 
 @dataclass
@@ -12,7 +13,7 @@ class ImageEmailPayload:
     subject_line: str
     data: Image
 
-    def to_microservice_json(self) -> str:
+    def to_microservice_json(self, extra: Optional[dict[str, Any]] = None) -> str:
         """Specifically for Ryan's Microservice A"""
         encoded_image = base64_encode_image(self.data)
         body = {
@@ -20,5 +21,15 @@ class ImageEmailPayload:
             "data_type": "image",
             "subject": self.subject_line,
             "receiver_email": self.to,
+            **(extra or {}),
         }
         return json.dumps(body)
+
+    def to_microservice_frames(self, encoding: str = "png") -> list[Buffer]:
+        """Same contract, in the binary multipart format"""
+        header = {
+            "data_type": "image",
+            "subject": self.subject_line,
+            "receiver_email": self.to,
+        }
+        return pack_frames(header, self.data, encoding)
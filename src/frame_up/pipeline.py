@@ -0,0 +1,241 @@
+"""
+A small dependency-tracked image pipeline, usable without Qt.
+
+    path ──> source ──> decoded ──> filtered ──> framed ──> display
+    filter, intensity ────────────────┘
+
+Every stage keeps its output until one of the inputs it depends on (directly
+or further upstream) changes, so changing the intensity never re-decodes the
+file and nothing upstream of `display` runs again for a repaint.
+
+The preview is decoded once per image at a fixed size (see preview_bounds),
+whatever the widget's size: resizing only rescales what's on screen.
+"""
+
+import os
+from threading import RLock
+from typing import Any, Callable, NamedTuple, Optional
+
+from PIL.Image import Image
+
+from frame_up.assetpack import ensure_pack
+from frame_up.file import open_for_size, open_image
+from frame_up.framing import (
+    fit_frame_size,
+    frame_image,
+    get_orientation,
+    get_slices,
+    inner_box,
+)
+from frame_up.tracing import span
+
+# the most a preview frame gets decoded/rendered at. Frames never get bigger
+# than their asset (see fit_frame_size), so this normally means the same
+# size as the saved image, and widgets only ever scale it down.
+preview_bounds = (2048, 2048)
+
+
+class Pipeline:
+    """
+    Named inputs feed named stages. `get(name)` computes whatever is missing
+    on the way to `name` and caches it. Safe to call from worker threads: a
+    result computed from inputs that changed in the meantime is returned but
+    not cached.
+    """
+
+    def __init__(self) -> None:
+        self.lock = RLock()
+        self.inputs: dict[str, Any] = {}
+        self.stages: dict[str, tuple[Callable[..., Any], tuple[str, ...]]] = {}
+        self.outputs: dict[str, Any] = {}
+        self.versions: dict[str, int] = {}
+        self.runs: dict[str, int] = {}  # how often each stage actually ran
+
+    def add_input(self, name: str, value: Any = None) -> None:
+        self.inputs[name] = value
+        self.versions[name] = 0
+
+    def add_stage(self, name: str, fn: Callable[..., Any], *deps: str) -> None:
+        """`fn` gets called with the values of `deps`, in order"""
+        for dep in deps:
+            if dep not in self.inputs and dep not in self.stages:
+                raise ValueError(f"stage {name} depends on unknown {dep}")
+        self.stages[name] = (fn, deps)
+        self.versions[name] = 0
+        self.runs[name] = 0
+
+    def set(self, name: str, value: Any) -> bool:
+        """Change an input. Returns whether anything got invalidated."""
+        with self.lock:
+            if self.inputs[name] == value:
+                return False
+            self.inputs[name] = value
+            self.invalidate(name)
+            return True
+
+    def get_input(self, name: str) -> Any:
+        return self.inputs[name]
+
+    def downstream(self, name: str) -> list[str]:
+        found: list[str] = []
+        for stage, (_, deps) in self.stages.items():
+            if name in deps:
+                found.append(stage)
+                found.extend(self.downstream(stage))
+        return found
+
+    def invalidate(self, name: str) -> None:
+        with self.lock:
+            self.versions[name] += 1
+            for stage in self.downstream(name):
+                self.outputs.pop(stage, None)
+                self.versions[stage] += 1
+
+    def release(self, name: str) -> None:
+        """Drop a cached output to save memory, it gets recomputed if needed"""
+        with self.lock:
+            self.outputs.pop(name, None)
+
+    def is_cached(self, name: str) -> bool:
+        return name in self.outputs
+
+    def get(self, name: str) -> Any:
+        if name in self.inputs:
+            return self.inputs[name]
+
+        with self.lock:
+            if name in self.outputs:
+                return self.outputs[name]
+            version = self.versions[name]
+
+        fn, deps = self.stages[name]
+        value = fn(*(self.get(dep) for dep in deps))
+
+        with self.lock:
+            self.runs[name] += 1
+            if self.versions[name] == version:
+                self.outputs[name] = value
+        return value
+
+
+#
+#   Preview stages
+#
+
+
+class SourceFile(NamedTuple):
+    """
+    The preview's "path" input: the path plus enough of its stat that editing
+    the file on disk counts as a change
+    """
+
+    path: str
+    mtime_ns: int
+    size: int
+
+
+def source_file(path: str) -> SourceFile:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return SourceFile(path, 0, -1)  # read_source says what's wrong with it
+    return SourceFile(path, stat.st_mtime_ns, stat.st_size)
+
+
+def read_source(path: str) -> tuple[str, tuple[int, int]]:
+    """Only the header: (orientation, size) of the image at `path`"""
+    with open_image(path) as image:
+        return get_orientation(image), image.size
+
+
+def decode_preview(
+    path: str, source: tuple[str, tuple[int, int]]
+) -> tuple[Image, tuple[int, int]]:
+    """A proxy of the image, plus the framed size that fits preview_bounds"""
+    _, image_size = source
+    size = fit_frame_size(image_size, preview_bounds)
+    return open_for_frame(path, size), size
+
+
+def open_for_frame(path: str, size: tuple[int, int]) -> Image:
+    """
+    Decode just enough of the image to fill the window of a frame of `size`,
+    within file.decode_budget
+    """
+    left, up, right, down = inner_box(size)
+    return open_for_size(path, (right - left, down - up))
+
+
+def apply_filter(image: Image, filter: Optional[str], intensity: float) -> Image:
+    """`filter` is a service name (any case), None for no filter"""
+    if filter is None:
+        return image
+    # the service/filter machinery isn't needed until someone picks a filter
+    from frame_up.services import get_filtered_image
+
+    with span("filter", filter=filter, intensity=intensity):
+        return get_filtered_image(filter.lower(), image, intensity)
+
+
+def build_preview_pipeline(
+    display: Callable[[Image], Any] = lambda image: image,
+) -> Pipeline:
+    """
+    Inputs: path (a SourceFile, see source_file), filter, intensity (0-1).
+    `display` turns the framed image into whatever the caller shows.
+    """
+    pipeline = Pipeline()
+    pipeline.add_input("path")
+    pipeline.add_input("filter")
+    pipeline.add_input("intensity", 1.0)
+
+    pipeline.add_stage("source", lambda file: read_source(file.path), "path")
+    pipeline.add_stage(
+        "decoded",
+        lambda file, source: decode_preview(file.path, source),
+        "path",
+        "source",
+    )
+    pipeline.add_stage(
+        "filtered",
+        lambda decoded, filter, intensity: apply_filter(decoded[0], filter, intensity),
+        "decoded",
+        "filter",
+        "intensity",
+    )
+    pipeline.add_stage(
+        "framed",
+        lambda filtered, decoded: frame_image(filtered, decoded[1]),
+        "filtered",
+        "decoded",
+    )
+    pipeline.add_stage("display", display, "framed")
+    return pipeline
+
+
+def render_full_image(path: str, filter: Optional[str], intensity: float) -> Image:
+    """
+    Full output size, for images leaving the app (save, email, batch).
+    The source only gets decoded as big as the frame's window needs, so
+    filtering and framing a huge scan costs about what a small photo does.
+    """
+    _, image_size = read_source(path)
+    size = fit_frame_size(image_size)
+    image = open_for_frame(path, size)
+    return frame_image(apply_filter(image, filter, intensity), size)
+
+
+def warm_up() -> None:
+    """
+    Get the slow, one-time loading out of the way: frame assets (and the
+    asset pack for next time), the filter services and zmq. Meant for a
+    background thread once the window is up.
+    """
+    with span("warm_up"):
+        ensure_pack()
+        for orientation in ("landscape", "portrait"):
+            get_slices(orientation)
+        # importing them is the slow part
+        import zmq  # noqa: F401
+
+        from frame_up import services  # noqa: F401
@@ -1,5 +1,8 @@
+import json
 from base64 import b64decode, b64encode
+from hashlib import blake2b
 from io import BytesIO
+from typing import Any, Optional, Union, cast
 
 from PIL import Image as im
 from PIL.Image import Image
@@ -17,3 +20,104 @@ def base64_decode_image(text: str) -> Image:
     image = im.open(img_bio)
     image.load()  # just in case?
     return image
+
+
+# image_digest hashes this much of an image at a time
+digest_band_bytes = 4 * 1024 * 1024
+
+
+def image_digest(image: Image) -> str:
+    """
+    Hash of the decoded pixels, so the same picture from two files matches.
+    Goes a band of rows at a time, so even a huge image only ever has a few
+    MB of it copied out for hashing.
+    """
+    digest = blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.width}x{image.height}".encode())
+    row_bytes = max(image.width * len(image.getbands()), 1)
+    rows = max(digest_band_bytes // row_bytes, 1)
+    for top in range(0, image.height, rows):
+        bottom = min(top + rows, image.height)
+        digest.update(image.crop((0, top, image.width, bottom)).tobytes())
+    return digest.hexdigest()
+
+
+#
+#   Binary wire protocol (v2)
+#
+#   frame 0: utf-8 JSON header, always with "protocol": 2
+#   frame 1: the image bytes, if any, described by the header's
+#            "encoding", "mode" and "size"
+#
+#   Services that only speak the old base64-in-JSON format (v1) reply with
+#   a single JSON frame that has no "protocol" key.
+#
+
+protocol_version = 2
+
+# fastest first: raw pixels cost nothing to encode, png/jpeg cost less bandwidth
+wire_encodings = ["raw", "png", "jpeg"]
+
+Buffer = Union[bytes, memoryview]
+
+
+def encode_image_bytes(image: Image, encoding: str) -> tuple[dict[str, Any], Buffer]:
+    """Image -> (header fields, payload) for the given wire encoding"""
+    match encoding:
+        case "raw":
+            if image.mode not in ("RGB", "RGBA", "L", "LA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            # one copy: pillow has no buffer of its pixels to share (and
+            # keeps RGB 4 bytes a pixel), zmq sends this one as it is
+            data: Buffer = image.tobytes()
+        case "png":
+            bio = BytesIO()
+            image.save(bio, format="png", compress_level=1)
+            data = bio.getbuffer()
+        case "jpeg":
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            bio = BytesIO()
+            image.save(bio, format="jpeg", quality=90)
+            data = bio.getbuffer()
+        case _:
+            raise ValueError("Unknown wire encoding: ", encoding)
+
+    fields = {"encoding": encoding, "mode": image.mode, "size": list(image.size)}
+    return fields, data
+
+
+def decode_image_bytes(header: dict[str, Any], data: Buffer) -> Image:
+    encoding = header.get("encoding")
+    match encoding:
+        case "raw":
+            mode = header["mode"]
+            size = tuple(header["size"])
+            # shares `data` where pillow can (not RGB), copy-on-write after
+            # that. It takes any buffer, its stubs only say bytes.
+            return im.frombuffer(mode, size, cast(bytes, data), "raw", mode, 0, 1)
+        case "png" | "jpeg":
+            image = im.open(BytesIO(data))
+            image.load()
+            return image
+        case _:
+            raise ValueError("Unknown wire encoding: ", encoding)
+
+
+def pack_frames(
+    header: dict[str, Any], image: Optional[Image] = None, encoding: str = "raw"
+) -> list[Buffer]:
+    header = {**header, "protocol": protocol_version}
+    if image is None:
+        return [json.dumps(header).encode()]
+
+    fields, data = encode_image_bytes(image, encoding)
+    header.update(fields)
+    return [json.dumps(header).encode(), data]
+
+
+def unpack_frames(frames: list[Buffer]) -> tuple[dict[str, Any], Optional[Image]]:
+    header = json.loads(bytes(frames[0]))
+    if len(frames) < 2 or header.get("protocol") != protocol_version:
+        return header, None
+    return header, decode_image_bytes(header, frames[1])
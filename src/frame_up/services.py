@@ -1,23 +1,153 @@
+import atexit
 import json
-from typing import Any, Optional, Sized
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Generator,
+    Hashable,
+    Optional,
+    Sized,
+    TypeVar,
+    cast,
+)
 
-import zmq
 from PIL.Image import Image
 
+from frame_up import filters, tracing
 from frame_up.models import ImageEmailPayload
-from frame_up.serialization import base64_decode_image, base64_encode_image
+from frame_up.serialization import (
+    Buffer,
+    base64_decode_image,
+    base64_encode_image,
+    image_digest,
+    pack_frames,
+    protocol_version,
+    unpack_frames,
+    wire_encodings,
+)
+from frame_up.tracing import log, span
+
+if TYPE_CHECKING:
+    # zmq takes a while to import, so that waits for the first request
+    import zmq
+
+T = TypeVar("T")
 
 # source from .env or something configurable?
-service_index = {
+# entries can also set "protocol" ("auto", "binary" or "legacy") and
+# "encoding" (one of serialization.wire_encodings) for binary requests
+service_index: dict[str, dict[str, str]] = {
     "email": {"host": "localhost", "port": "5555"},
     "antique": {"host": "localhost", "port": "8673"},
     "vibrant": {"host": "localhost", "port": "8674"},
     "monochrome": {"host": "localhost", "port": "8675"},
 }
 
+# extra (host, port) copies of a service, used by the asyncio client
+service_replicas: dict[str, list[tuple[str, str]]] = {
+    "email": [],
+    "antique": [],
+    "vibrant": [],
+    "monochrome": [],
+}
+
 # Timeouts (in milliseconds)
 timeouts: dict[str, int] = {"connect": 1 * 1000, "send": 5 * 1000, "recv": 5 * 1000}
 
+default_wire_encoding = "raw"
+
+# what "auto" found out about each service: "binary" or "legacy"
+service_protocols: dict[str, str] = {}
+
+# Where each filter runs: "local", "remote" or "remote-with-local-fallback"
+filter_modes: dict[str, str] = {
+    "antique": "remote-with-local-fallback",
+    "vibrant": "remote-with-local-fallback",
+    "monochrome": "remote-with-local-fallback",
+}
+
+# Filters whose intensity is a straight blend between the original and the
+# full strength result. These get fetched once at intensity 1 and mixed locally,
+# anything else needs an exact request for every intensity.
+linear_intensity: dict[str, bool] = {
+    "antique": True,
+    "vibrant": True,
+    "monochrome": True,
+}
+
+# after a failed remote call, go straight to the fallback for this long (seconds)
+fallback_cooldown = 30.0
+unavailable_until: dict[str, float] = {}
+
+
+class FilterCache:
+    """
+    LRU of filtered images, bounded by the bytes of pixel data it holds.
+    Cached images are shared, so don't mutate what comes out of it.
+    """
+
+    max_bytes: int
+    nbytes: int
+    hits: int
+    misses: int
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[Hashable, Image] = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()  # the GUI filters on worker threads
+
+    @staticmethod
+    def size_of(image: Image) -> int:
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, key: Hashable) -> Optional[Image]:
+        with self.lock:
+            image = self.entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key: Hashable, image: Image) -> None:
+        size = self.size_of(image)
+        with self.lock:
+            if size > self.max_bytes:
+                return  # would just flush everything else out
+            if key in self.entries:
+                self.nbytes -= self.size_of(self.entries.pop(key))
+            self.entries[key] = image
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= self.size_of(evicted)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+        }
+
+
+# set max_bytes to 0 to turn caching off
+filter_cache = FilterCache(max_bytes=256 * 1024 * 1024)
+
 
 def pretty_print(response: dict[str, str]):
     print("{")
@@ -28,6 +158,15 @@ def pretty_print(response: dict[str, str]):
     print("}")
 
 
+def log_response(service: str, response: dict[str, Any]) -> None:
+    # printing every response costs real time with big base64 payloads,
+    # so the full dump only happens in verbose mode
+    status = response.get("status", response.get("success"))
+    log("[zmq] recieved response", "zmq", service=service, status=status)
+    if tracing.verbose:
+        pretty_print(response)
+
+
 def antique_filter(image: Image, intensity: float) -> Image:
     return get_filtered_image("antique", image, intensity)
 
@@ -40,54 +179,375 @@ def monochrome_filter(image: Image, intensity: float) -> Image:
     return get_filtered_image("monochrome", image, intensity)
 
 
-def get_filtered_image(filter: str, image: Image, intensity: float = 1) -> Image:
-    host = service_index[filter]["host"]
-    port = service_index[filter]["port"]
+# what filter_steps asks for: ("filter", (filter, image, intensity, mode, exact))
+# for another get_filtered_image, ("remote", (filter, image, intensity)) for the
+# service call and ("run", (function, *args)) for local pixel work
+FilterStep = tuple[str, tuple[Any, ...]]
 
-    if host is None or port is None:
-        raise ValueError("couldn't find configuration for filter: ", filter)
 
-    print(f"[zmq] 🖼️  preparing request for image filter: {filter}")
+def filter_steps(
+    filter: str,
+    image: Image,
+    intensity: float,
+    mode: Optional[str],
+    exact: Optional[bool],
+) -> Generator[FilterStep, Any, Image]:
+    """
+    Everything get_filtered_image and get_filtered_image_async decide (blending
+    lower intensities, the cache, filter modes, the fallback cooldown), without
+    doing any of the work. The caller does each step it yields and sends back
+    the result, or throws in the exception. Returns the filtered image.
+    """
+    if mode is None:
+        mode = filter_modes[filter]
+    if exact is None:
+        exact = not linear_intensity.get(filter, False)
+
+    if not exact and intensity != 1:
+        if intensity <= 0:
+            return image
+        full = yield "filter", (filter, image, 1, mode, True)
+        if full.size == image.size:
+            return (yield "run", (filters.blend, image, full, intensity))
+        print(f"[filter] {filter} changed the image size, can't blend it locally")
+
+    key = None
+    if filter_cache.max_bytes > 0:
+        digest = yield "run", (image_digest, image)
+        key = (digest, filter, float(intensity), mode)
+        cached = filter_cache.get(key)
+        if cached is not None:
+            return cached
+
+    local = filters.local_filters[filter]
+    match mode:
+        case "local":
+            result = yield "run", (local, image, intensity)
+        case "remote":
+            result = yield "remote", (filter, image, intensity)
+        case "remote-with-local-fallback":
+            # fallback results aren't cached, the service may be back next time
+            if time.monotonic() < unavailable_until.get(filter, 0):
+                return (yield "run", (local, image, intensity))
+            try:
+                result = yield "remote", (filter, image, intensity)
+            except SystemError as e:
+                print(f"[zmq] {e}, using the local {filter} filter instead")
+                unavailable_until[filter] = time.monotonic() + fallback_cooldown
+                return (yield "run", (local, image, intensity))
+        case _:
+            raise ValueError("Unknown filter mode: ", mode)
+
+    if key is not None:
+        filter_cache.put(key, result)
+    return result
+
 
-    payload = json.dumps({"image": base64_encode_image(image), "intensity": intensity})
-    response = send_recv_zmq(host, port, payload)
+def get_filtered_image(
+    filter: str,
+    image: Image,
+    intensity: float = 1,
+    *,
+    mode: Optional[str] = None,
+    exact: Optional[bool] = None,
+) -> Image:
+    """
+    Filter `image` at `intensity` (0 to 1).
 
+    Unless `exact` is set (or the filter isn't in `linear_intensity`), only the
+    full strength result is requested and lower intensities are blended here.
+    """
+    steps = filter_steps(filter, image, intensity, mode, exact)
+    result: Any = None
+    error: Optional[Exception] = None
+    while True:
+        try:
+            kind, args = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as done:
+            return done.value
+
+        result, error = None, None
+        try:
+            match kind:
+                case "filter":
+                    filter, image, intensity, mode, exact = args
+                    result = get_filtered_image(
+                        filter, image, intensity, mode=mode, exact=exact
+                    )
+                case "remote":
+                    result = get_remote_filtered_image(*args)
+                case _:
+                    result = args[0](*args[1:])
+        except Exception as e:
+            error = e
+
+
+def get_remote_filtered_image(filter: str, image: Image, intensity: float = 1) -> Image:
+    with span("filter.request", filter=filter, intensity=intensity):
+        response, result = send_recv_service(
+            filter, *filter_request(image, intensity), idempotent=True
+        )
+        return filter_result(filter, response, result)
+
+
+def filter_request(
+    image: Image, intensity: float
+) -> tuple[Callable[[str], list[Buffer]], Callable[[dict[str, Any]], str]]:
+    """Binary and base64 JSON builders for a filter request"""
+    return (
+        lambda encoding: pack_frames(
+            {"intensity": intensity, "accept": wire_encodings}, image, encoding
+        ),
+        lambda extra: json.dumps(
+            {"image": base64_encode_image(image), "intensity": intensity, **extra}
+        ),
+    )
+
+
+def filter_result(
+    filter: str, response: Optional[dict[str, Any]], result: Optional[Image]
+) -> Image:
     if not response or response["status"] == "error":
-        raise SystemError("antique_filter failed")
-    return base64_decode_image(response["image"])
+        raise SystemError(f"{filter} filter failed")
+    if result is None:
+        result = base64_decode_image(response["image"])
+    return result
 
 
-def send_recv_zmq(host: str, port: str, payload: str) -> Optional[Any]:
-    connection = f"tcp://{host}:{port}"
+def get_protocol(service: str) -> str:
+    configured = service_index[service].get("protocol", "auto")
+    if configured != "auto":
+        return configured
+    return service_protocols.get(service, "auto")
 
-    context = zmq.Context()
-    socket = context.socket(zmq.REQ)
 
-    socket.setsockopt(zmq.CONNECT_TIMEOUT, timeouts["connect"])
-    socket.setsockopt(zmq.SNDTIMEO, timeouts["send"])
-    socket.setsockopt(zmq.RCVTIMEO, timeouts["recv"])
-    socket.connect(connection)
-    print(f"[zmq] 🔌 {connection} | timeouts = {timeouts}")
+def get_endpoints(service: str) -> list[str]:
+    """The service's own address first, then any replicas"""
+    host = service_index[service]["host"]
+    port = service_index[service]["port"]
+
+    if host is None or port is None:
+        raise ValueError("couldn't find configuration for service: ", service)
 
-    try:
-        socket.send_string(payload)
-        response = socket.recv_json()
-        print("[zmq] recieved response:")
-        pretty_print(response)  # type: ignore
+    endpoints = [f"tcp://{host}:{port}"]
+    endpoints += [
+        f"tcp://{host}:{port}" for host, port in service_replicas.get(service, [])
+    ]
+    return endpoints
+
+
+def build_service_request(
+    service: str,
+    frames: Callable[[str], list[Buffer]],
+    payload: Callable[[dict[str, Any]], str],
+) -> tuple[str, list[Buffer]]:
+    """
+    The request frames in whichever format the service speaks.
+
+    `frames(encoding)` builds the binary request and `payload(extra)` the base64
+    JSON one, only the one that's needed gets encoded.
+
+    The first request to an "auto" service goes out as base64 JSON with an
+    "accept_protocol" key. Old services ignore it and answer as usual, newer
+    ones answer in binary, and either way we know what to send next time.
+    """
+    protocol = get_protocol(service)
+    with span("service.encode", service=service, protocol=protocol):
+        if protocol == "binary":
+            encoding = service_index[service].get("encoding", default_wire_encoding)
+            return protocol, frames(encoding)
+        if protocol == "auto":
+            offer = {"accept_protocol": protocol_version, "accept": wire_encodings}
+            return protocol, [payload(offer).encode()]
+        return protocol, [payload({}).encode()]
+
+
+def read_service_reply(
+    service: str, protocol: str, reply: list["zmq.Frame"]
+) -> tuple[dict[str, Any], Optional[Image]]:
+    """Reply header (or JSON body) and, for binary replies, the decoded image"""
+    with span("service.decode", service=service):
+        header, image = unpack_frames([frame.buffer for frame in reply])
+    if protocol == "auto":
+        binary = header.get("protocol") == protocol_version
+        service_protocols[service] = "binary" if binary else "legacy"
+        print(f"[zmq] {service} speaks the {service_protocols[service]} protocol")
+
+    log_response(service, header)
+    return header, image
+
+
+def send_recv_service(
+    service: str,
+    frames: Callable[[str], list[Buffer]],
+    payload: Callable[[dict[str, Any]], str],
+    *,
+    idempotent: bool = False,
+) -> tuple[Optional[dict[str, Any]], Optional[Image]]:
+    """
+    Blocking request to the service's main endpoint, see build_service_request.
+    Only `idempotent` requests (filters, not emails) are ever sent twice.
+    """
+    host = service_index[service]["host"]
+    port = service_index[service]["port"]
+
+    if host is None or port is None:
+        raise ValueError("couldn't find configuration for service: ", service)
+
+    protocol, request = build_service_request(service, frames, payload)
+    reply = send_recv_multipart(host, port, request, idempotent=idempotent)
+    if reply is None:
+        return None, None
+    return read_service_reply(service, protocol, reply)
+
+
+class ConnectionPool:
+    """
+    One zmq context and a stack of idle REQ sockets per endpoint.
+
+    A REQ socket that timed out is stuck mid-conversation, so it's closed
+    and replaced instead of going back in the pool (the "lazy pirate" fix).
+    """
+
+    def __init__(self, context_class: Optional[type["zmq.Context"]] = None) -> None:
+        self.context_class = context_class  # None for a plain zmq.Context
+        self.context: Optional["zmq.Context"] = None
+        self.idle: dict[str, list["zmq.Socket"]] = {}
+        self.lock = Lock()
+        self.pid = os.getpid()
+        self.created = 0
+        self.reused = 0
+        self.reset = 0
+
+    def check_fork(self) -> None:
+        # a forked batch worker can't use the parent's context or sockets
+        if self.pid != os.getpid():
+            self.context = None
+            self.idle = {}
+            self.pid = os.getpid()
+
+    def acquire(self, endpoint: str) -> tuple["zmq.Socket", bool]:
+        """A connected socket for `endpoint`, and whether it was reused"""
+        import zmq
+
+        with self.lock:
+            self.check_fork()
+            idle = self.idle.get(endpoint)
+            if idle:
+                self.reused += 1
+                return idle.pop(), True
+
+            if self.context is None:
+                self.context = (self.context_class or zmq.Context)()
+            socket = self.context.socket(zmq.REQ)
+            self.created += 1
+
+        socket.setsockopt(zmq.CONNECT_TIMEOUT, timeouts["connect"])
+        socket.setsockopt(zmq.SNDTIMEO, timeouts["send"])
+        socket.setsockopt(zmq.RCVTIMEO, timeouts["recv"])
+        socket.setsockopt(zmq.LINGER, 0)  # don't hang on close if nobody answered
+        socket.connect(endpoint)
+        log("[zmq] 🔌 connect", "zmq", endpoint=endpoint, timeouts=timeouts)
+        return socket, False
+
+    def release(self, endpoint: str, socket: "zmq.Socket") -> None:
+        with self.lock:
+            self.idle.setdefault(endpoint, []).append(socket)
+
+    def discard(self, socket: "zmq.Socket") -> None:
+        socket.close(linger=0)
+        with self.lock:
+            self.reset += 1
+
+    def close(self) -> None:
+        with self.lock:
+            for sockets in self.idle.values():
+                for socket in sockets:
+                    socket.close(linger=0)
+            self.idle = {}
+            if self.context is not None and self.pid == os.getpid():
+                self.context.term()
+            self.context = None
+
+    def stats(self) -> dict[str, int]:
+        return {"created": self.created, "reused": self.reused, "reset": self.reset}
+
+
+connection_pool = ConnectionPool()
+atexit.register(connection_pool.close)
+
+
+def request_zmq(
+    host: str,
+    port: str,
+    send: Callable[["zmq.Socket"], Any],
+    recv: Callable[["zmq.Socket"], T],
+    *,
+    idempotent: bool = False,
+) -> Optional[T]:
+    """
+    One request/reply on a pooled socket, None if it failed.
+
+    A pooled socket may have gone stale (e.g. the service restarted), so if
+    the request couldn't even be sent on one it gets one more try on a fresh
+    connection. Only for `idempotent` requests though, and never once it's
+    out: a recv timeout may just be a slow service that's still working on it.
+    """
+    import zmq
+
+    endpoint = f"tcp://{host}:{port}"
+
+    while True:
+        socket, reused = connection_pool.acquire(endpoint)
+        sent = False
+        try:
+            with span("zmq.roundtrip", "zmq", endpoint=endpoint):
+                send(socket)
+                sent = True
+                response = recv(socket)
+        except zmq.ZMQError as z:
+            print("[zmq error]", z)
+            connection_pool.discard(socket)
+            if reused and idempotent and not sent:
+                continue
+            return None
+
+        connection_pool.release(endpoint, socket)
         return response
-    except zmq.ZMQError as z:
-        print("[zmq error]", z)
-        return None
-    finally:
-        context.destroy()  # this may be enough
+
+
+def send_recv_zmq(host: str, port: str, payload: str) -> Optional[dict[str, Any]]:
+    # the services always answer with a JSON object
+    response = request_zmq(
+        host,
+        port,
+        lambda socket: socket.send_string(payload),
+        lambda socket: cast(dict[str, Any], socket.recv_json()),
+    )
+    if response is not None:
+        log_response(f"{host}:{port}", response)
+    return response
+
+
+def send_recv_multipart(
+    host: str, port: str, frames: list[Buffer], *, idempotent: bool = False
+) -> Optional[list["zmq.Frame"]]:
+    """Multipart request/reply, zmq doesn't copy the frames (copy=False)"""
+    return request_zmq(
+        host,
+        port,
+        lambda socket: socket.send_multipart(frames, copy=False),
+        lambda socket: socket.recv_multipart(copy=False),
+        idempotent=idempotent,
+    )
 
 
 def email_image(payload: ImageEmailPayload) -> bool:
     """contact email service w/ contract info"""
-    host = service_index["email"]["host"]
-    port = service_index["email"]["port"]
-
-    response = send_recv_zmq(host, port, payload.to_microservice_json())
+    with span("email"):
+        response, _ = send_recv_service(
+            "email", payload.to_microservice_frames, payload.to_microservice_json
+        )
 
     if not response or not response["success"]:
         raise SystemError("send_email failed")
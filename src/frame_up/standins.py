@@ -0,0 +1,251 @@
+"""
+Stand-in versions of the filter and email microservices.
+
+They answer the same requests as the real ones (base64 JSON, the binary v2
+protocol and the "accept_protocol" offer in between), filtering with the
+in-process filters and "sending" email by just decoding the image. Latency,
+error rate and worker count are configurable (StandinConfig), to play the
+part of a loaded fleet.
+
+Good for benchmarks, load tests (frame_up.loadgen) and running the app
+without the real services around: `frame-up serve` listens on the ports in
+services.service_index.
+"""
+
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import zmq
+from PIL.Image import Image
+
+from frame_up import filters, services
+from frame_up.serialization import (
+    Buffer,
+    base64_decode_image,
+    base64_encode_image,
+    pack_frames,
+    protocol_version,
+    unpack_frames,
+    wire_encodings,
+)
+
+standin_services = ["email", *filters.local_filters]
+
+# how often a server thread checks whether it should stop (ms)
+poll_interval_ms = 100
+
+
+def wants_binary(header: dict[str, Any]) -> bool:
+    return protocol_version in (header.get("protocol"), header.get("accept_protocol"))
+
+
+def handle_request(service: str, frames: list[Buffer]) -> list[Buffer]:
+    """One request in, one reply out, in the protocol the client asked for"""
+    header, image = unpack_frames(frames)
+    binary = wants_binary(header)
+
+    if image is None:
+        encoded = header.get("image") or header.get("data")
+        if encoded:
+            image = base64_decode_image(encoded)
+
+    if service == "email":
+        reply: dict[str, Any] = {"success": image is not None}
+        result: Optional[Image] = None
+    elif image is None:
+        reply, result = {"status": "error", "message": "no image"}, None
+    else:
+        intensity = float(header.get("intensity", 1))
+        reply, result = (
+            {"status": "ok"},
+            filters.local_filters[service](image, intensity),
+        )
+
+    if binary:
+        # answer in the encoding the client used, if it took one it can read
+        accept = header.get("accept", wire_encodings)
+        encoding = header.get("encoding", "raw")
+        if encoding not in accept:
+            encoding = accept[0]
+        return pack_frames(reply, result, encoding)
+
+    if result is not None:
+        reply["image"] = base64_encode_image(result)
+    return [json.dumps(reply).encode()]
+
+
+def error_reply(service: str, frames: list[Buffer]) -> list[Buffer]:
+    """What a failing service sends back"""
+    reply = {"success": False} if service == "email" else {"status": "error"}
+    try:
+        binary = wants_binary(json.loads(bytes(frames[0])))
+    except ValueError:
+        binary = False
+    # a legacy answer to an "accept_protocol" offer would pin the client to v1
+    return pack_frames(reply) if binary else [json.dumps(reply).encode()]
+
+
+@dataclass
+class StandinConfig:
+    """How the stand-in behaves, to look more like a real (busy) service"""
+
+    latency: float = 0.0  # extra seconds per request
+    jitter: float = 0.0  # plus up to this many seconds, uniformly random
+    error_rate: float = 0.0  # fraction of requests answered with an error
+    workers: int = 1  # requests handled at the same time
+    seed: Optional[int] = None  # for repeatable latency/error sequences
+
+
+class StandinServer:
+    """
+    One stand-in service: a ROUTER socket on `port` handing requests to
+    `config.workers` REP worker threads, so clients see a normal REP service
+    """
+
+    service: str
+    port: int
+
+    def __init__(
+        self,
+        service: str,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        config: Optional[StandinConfig] = None,
+    ) -> None:
+        if service not in standin_services:
+            raise ValueError("No stand-in for service: ", service)
+        self.service = service
+        self.host = host
+        self.config = config or StandinConfig()
+        self.random = random.Random(self.config.seed)
+        self.random_lock = threading.Lock()
+
+        self.context = zmq.Context()
+        self.frontend = self.context.socket(zmq.ROUTER)
+        self.frontend.setsockopt(zmq.LINGER, 0)
+        if port:
+            self.frontend.bind(f"tcp://{host}:{port}")
+            self.port = port
+        else:
+            self.port = self.frontend.bind_to_random_port(f"tcp://{host}")
+        self.backend = self.context.socket(zmq.DEALER)
+        self.backend.setsockopt(zmq.LINGER, 0)
+        self.backend_address = f"inproc://standin-{service}-{id(self)}"
+        self.backend.bind(self.backend_address)
+
+        self.requests = 0
+        self.errors = 0
+        self.stopping = threading.Event()
+        self.threads = [
+            threading.Thread(target=self.proxy, name=f"standin-{service}", daemon=True)
+        ]
+        self.threads += [
+            threading.Thread(
+                target=self.work, name=f"standin-{service}-{n}", daemon=True
+            )
+            for n in range(max(self.config.workers, 1))
+        ]
+
+    @property
+    def endpoint(self) -> str:
+        return f"tcp://{self.host}:{self.port}"
+
+    def start(self) -> "StandinServer":
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def proxy(self) -> None:
+        """Shuffle requests to the workers and replies back, until stopped"""
+        poller = zmq.Poller()
+        poller.register(self.frontend, zmq.POLLIN)
+        poller.register(self.backend, zmq.POLLIN)
+        try:
+            while not self.stopping.is_set():
+                for socket, _ in poller.poll(poll_interval_ms):
+                    other = self.backend if socket is self.frontend else self.frontend
+                    other.send_multipart(socket.recv_multipart(copy=False), copy=False)
+        finally:
+            self.frontend.close()
+            self.backend.close()
+
+    def work(self) -> None:
+        socket = self.context.socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.backend_address)
+        try:
+            while not self.stopping.is_set():
+                if not socket.poll(poll_interval_ms):
+                    continue
+                frames: list[Buffer] = [
+                    f.buffer for f in socket.recv_multipart(copy=False)
+                ]
+                socket.send_multipart(self.respond(frames), copy=False)
+        finally:
+            socket.close()
+
+    def respond(self, frames: list[Buffer]) -> list[Buffer]:
+        config = self.config
+        with self.random_lock:
+            delay = config.latency + self.random.uniform(0, config.jitter)
+            fail = self.random.random() < config.error_rate
+        if delay > 0:
+            time.sleep(delay)
+
+        reply = None
+        if not fail:
+            try:
+                reply = handle_request(self.service, frames)
+            except Exception as e:
+                print(f"[standin] {self.service} failed: {e!r}")
+                fail = True
+        if reply is None:
+            reply = error_reply(self.service, frames)
+
+        with self.random_lock:
+            self.requests += 1
+            self.errors += fail
+        return reply
+
+    def stop(self) -> None:
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+        self.context.term()
+
+
+def start_standins(
+    names: Optional[list[str]] = None,
+    host: str = "127.0.0.1",
+    config: Optional[StandinConfig] = None,
+    ports: Optional[dict[str, int]] = None,
+) -> dict[str, StandinServer]:
+    """
+    One server per service (all of them by default), on `ports` where given
+    and free ports otherwise
+    """
+    ports = ports or {}
+    return {
+        name: StandinServer(name, host, ports.get(name, 0), config).start()
+        for name in names or standin_services
+    }
+
+
+def stop_standins(servers: dict[str, StandinServer]) -> None:
+    for server in servers.values():
+        server.stop()
+
+
+def use_standins(ports: dict[str, int], host: str = "127.0.0.1") -> None:
+    """Point services.service_index at stand-ins listening on `ports`"""
+    for name, port in ports.items():
+        services.service_index[name] = {
+            **services.service_index[name],
+            "host": host,
+            "port": str(port),
+        }
+        services.service_protocols.pop(name, None)
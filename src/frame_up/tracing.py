@@ -0,0 +1,178 @@
+"""
+Timing spans for the image pipeline.
+
+    with span("filter.request", filter="antique"):
+        ...
+
+Off by default, and then a span is one flag check and a shared do-nothing
+context manager. Turn it on with `enable()` (or FRAME_UP_TRACE=1) to collect
+spans in memory, look at `summary()` (the GUI shows it in the status bar),
+and `export_chrome_trace(path)` to open them in chrome://tracing or Perfetto.
+
+`log()` is for the chatty per-request messages: an instant event in the trace
+when tracing is on, printed only with FRAME_UP_VERBOSE=1.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+enabled = os.environ.get("FRAME_UP_TRACE", "") not in ("", "0")
+verbose = os.environ.get("FRAME_UP_VERBOSE", "") not in ("", "0")
+
+# oldest events get dropped past this many
+max_events = 100_000
+
+# (phase, name, category, start ns, duration ns, thread id, args)
+Event = tuple[str, str, str, int, int, int, dict[str, Any]]
+events: deque[Event] = deque(maxlen=max_events)
+
+# name -> [count, total ns, max ns, last ns], kept for every span ever finished
+totals: dict[str, list[int]] = {}
+
+thread_names: dict[int, str] = {}
+_lock = threading.Lock()
+_null_span = nullcontext()
+_pid = os.getpid()
+
+
+class Span:
+    __slots__ = ("name", "category", "args", "start")
+
+    def __init__(self, name: str, category: str, args: dict[str, Any]) -> None:
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        duration = time.perf_counter_ns() - self.start
+        record("X", self.name, self.category, self.start, duration, self.args)
+
+
+def record(
+    phase: str, name: str, category: str, start: int, duration: int, args: dict
+) -> None:
+    thread = threading.current_thread()
+    with _lock:
+        thread_names.setdefault(thread.ident or 0, thread.name)
+        events.append((phase, name, category, start, duration, thread.ident or 0, args))
+        if phase == "X":
+            total = totals.get(name)
+            if total is None:
+                total = totals[name] = [0, 0, 0, 0]
+            total[0] += 1
+            total[1] += duration
+            total[2] = max(total[2], duration)
+            total[3] = duration
+
+
+def span(name: str, category: str = "frame_up", **args: Any):
+    """Time the `with` block, when tracing is on"""
+    if not enabled:
+        return _null_span
+    return Span(name, category, args)
+
+
+def traced(name: str, category: str = "frame_up") -> Callable[[T], T]:
+    """Decorator version of span"""
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            with Span(name, category, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator  # type: ignore
+
+
+def log(message: str, category: str = "frame_up", **args: Any) -> None:
+    """A moment worth marking, not worth a print on every request"""
+    if enabled:
+        record("i", message, category, time.perf_counter_ns(), 0, args)
+    if verbose:
+        print(message, *(f"{key}={value}" for key, value in args.items()))
+
+
+def enable() -> None:
+    global enabled
+    enabled = True
+
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+
+def clear() -> None:
+    with _lock:
+        events.clear()
+        totals.clear()
+
+
+def summary() -> dict[str, dict[str, float]]:
+    """Per span name: count, total/mean/max/last in milliseconds"""
+    with _lock:
+        return {
+            name: {
+                "count": count,
+                "total_ms": total / 1e6,
+                "mean_ms": total / count / 1e6,
+                "max_ms": longest / 1e6,
+                "last_ms": last / 1e6,
+            }
+            for name, (count, total, longest, last) in totals.items()
+        }
+
+
+def chrome_trace() -> dict[str, Any]:
+    """The events in Chrome's trace event format (timestamps in microseconds)"""
+    with _lock:
+        recorded = list(events)
+        names = dict(thread_names)
+
+    trace: list[dict[str, Any]] = [
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": _pid,
+            "tid": tid,
+            "args": {"name": name},
+        }
+        for tid, name in names.items()
+    ]
+    for phase, name, category, start, duration, tid, args in recorded:
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": phase,
+            "ts": start / 1000,
+            "pid": _pid,
+            "tid": tid,
+            "args": {key: str(value) for key, value in args.items()},
+        }
+        if phase == "X":
+            event["dur"] = duration / 1000
+        else:
+            event["s"] = "t"  # instant event scoped to its thread
+        trace.append(event)
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+def export_chrome_trace(path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(), f)
@@ -0,0 +1,32 @@
+from frame_up.tracing import span
+from PIL.Image import Image
+from PySide6.QtGui import QImage
+
+# pillow mode -> (QImage format, bytes per pixel), all laid out the same way
+qt_formats: dict[str, tuple[QImage.Format, int]] = {
+    "RGB": (QImage.Format.Format_RGB888, 3),
+    "RGBA": (QImage.Format.Format_RGBA8888, 4),
+    "L": (QImage.Format.Format_Grayscale8, 1),
+}
+
+
+class BufferedQImage(QImage):
+    """A QImage over a bytes buffer it keeps alive, Qt doesn't own the pixels"""
+
+    buffer: bytes
+
+    def __init__(self, buffer: bytes, width: int, height: int, format, depth: int):
+        super().__init__(buffer, width, height, width * depth, format)
+        self.buffer = buffer
+
+
+def pil_to_qimage(image: Image) -> BufferedQImage:
+    """
+    One copy out of pillow (tobytes) and Qt reads it in place, instead of
+    ImageQt's convert + byte shuffling + copy.
+    """
+    with span("qt.convert", size=image.size, mode=image.mode):
+        if image.mode not in qt_formats:
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        format, depth = qt_formats[image.mode]
+        return BufferedQImage(image.tobytes(), image.width, image.height, format, depth)
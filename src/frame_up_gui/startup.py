@@ -0,0 +1,71 @@
+"""
+Startup probe for `frame-up startup`: starts the app the same way
+frame_up_gui.__main__ does, reports how long each part took once the first
+paint happens, and quits.
+"""
+
+import time
+
+started = time.perf_counter()  # as early as this process gets to run our code
+
+import json  # noqa: E402
+import sys  # noqa: E402
+
+from PySide6 import QtCore  # noqa: E402
+
+from frame_up_gui.App import FrameUpApp  # noqa: E402
+from frame_up_gui.widgets.MainWindow import MainWindow  # noqa: E402
+
+imported = time.perf_counter()
+
+# the line the benchmark looks for on stdout
+marker = "FRAME_UP_STARTUP"
+
+# give up if nothing got painted by then (ms)
+paint_timeout_ms = 30_000
+
+
+class FirstPaint(QtCore.QObject):
+    """Reports the first paint event anywhere in the app"""
+
+    def __init__(self, report, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.report = report
+        self.painted = False
+
+    def eventFilter(self, watched: QtCore.QObject, event: QtCore.QEvent) -> bool:
+        if not self.painted and event.type() == QtCore.QEvent.Type.Paint:
+            self.painted = True
+            # report after this paint is done, not before it starts
+            QtCore.QTimer.singleShot(0, self.report)
+        return False
+
+
+def ms(since: float) -> float:
+    return (time.perf_counter() - since) * 1000
+
+
+def main() -> int:
+    timings = {"imports_ms": (imported - started) * 1000}
+
+    app = FrameUpApp(sys.argv)
+    timings["app_ms"] = ms(started)
+
+    def report() -> None:
+        timings["first_paint_ms"] = ms(started)
+        print(marker, json.dumps(timings), flush=True)
+        app.quit()
+
+    first_paint = FirstPaint(report)
+    app.installEventFilter(first_paint)
+    QtCore.QTimer.singleShot(paint_timeout_ms, app.quit)
+
+    window = MainWindow()  # noqa: F841
+    timings["window_ms"] = ms(started)
+
+    app.exec()
+    return 0 if first_paint.painted else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,13 @@
+import reprlib
 from typing import Any, Callable, Optional
 
+from frame_up import tracing
+from frame_up.tracing import log, span
 from PySide6.QtCore import (
     QObject,
     QRunnable,
     QThreadPool,
+    QTimer,
     Signal,
     Slot,
 )
@@ -13,6 +17,7 @@ class TaskSignals(QObject):
     """Because signals ONLY work on QObjects"""
 
     result = Signal(object)
+    error = Signal(object)
     done = Signal()
 
 
@@ -36,12 +41,18 @@ class Task(QRunnable):
 
     @Slot()
     def run(self) -> None:
-        result = None
         try:
-            result = self.fn(*self.args, **self.kwargs)
+            name = getattr(self.fn, "__qualname__", repr(self.fn))
+            # the trace outlives the task, so it only gets a short description
+            # of the args (which can be whole images), not the args themselves
+            args = reprlib.repr(self.args) if tracing.enabled else ""
+            with span("task", "qt", fn=name, args=args):
+                result = self.fn(*self.args, **self.kwargs)
         except Exception as e:
-            print(e)  # nothing?
-        self.signals.result.emit(result)
+            print(e)
+            self.signals.error.emit(e)
+        else:
+            self.signals.result.emit(result)
         self.signals.done.emit()
 
 
@@ -49,42 +60,127 @@ class BackgroundTasker:
     """
     Class mixin to do some work off the GUI thread
 
+    Tasks sent with a `key` replace each other: a new task for the same key
+    pulls the older one out of the queue if it hasn't started yet, and drops
+    its result if it has. With `debounce_ms` the task only starts once no new
+    task for that key has come in for that long.
+
     don't forget to call `clean_background_tasks` when done!
     """
 
     pool = QThreadPool.globalInstance()
 
+    def task_state(self) -> dict[str, dict]:
+        # a mixin doesn't get a reliable __init__, so set up on first use
+        state = self.__dict__.get("_task_state")
+        if state is None:
+            state = {
+                "generations": {},  # key -> number of the newest task
+                "latest": {},  # key -> newest task, while queued or running
+                "alive": {},  # id -> task, keeps keyed tasks alive until done
+                "pending": {},  # key -> start function waiting on debounce
+                "timers": {},  # key -> debounce timer
+            }
+            self.__dict__["_task_state"] = state
+        return state
+
+    def is_current(self, key: str, generation: int) -> bool:
+        return self.task_state()["generations"].get(key) == generation
+
     def send_task(
         self,
         fn: Callable,
         *args,
         result_cb: Optional[Callable],
         finished_cb: Optional[Callable],
+        error_cb: Optional[Callable] = None,
+        key: Optional[str] = None,
+        debounce_ms: int = 0,
         **kwargs,
     ) -> None:
-        print(f"creating task with fn={fn} args={args} kwargs={kwargs}")
+        log("creating task", "qt", fn=fn, args=args, kwargs=kwargs, key=key)
         task = Task(fn, *args, **kwargs)
         worker_id = id(task)
 
-        # Connect callbacks if specified
-        if result_cb is not None:
-            task.signals.result.connect(result_cb)
-        if finished_cb is not None:
-            task.signals.result.connect(finished_cb)
-
-        # Debug callbacks
-        # task.signals.result.connect(
-        #     lambda *a, **kw: self.log(f"[{worker_id} result]", *a, **kw)
-        # )
-        # task.signals.done.connect(
-        #     lambda *a, **kw: self.log(f"[{worker_id} done]", *a, **kw)
-        # )
-
-        self.pool.start(task)
-        print(f"sent worker (id={worker_id}) to pool")
-
-        # TODO/bcl can we even start and then hook up a signal?
-        # return runnable
+        if key is None:
+            # Connect callbacks if specified
+            if result_cb is not None:
+                task.signals.result.connect(result_cb)
+            if finished_cb is not None:
+                task.signals.done.connect(finished_cb)
+            if error_cb is not None:
+                task.signals.error.connect(error_cb)
+            self.pool.start(task)
+            log("sent worker to pool", "qt", id=worker_id)
+            return
+
+        state = self.task_state()
+        self.supersede(key)
+        generation = state["generations"][key]
+
+        # we hold on to keyed tasks ourselves so tryTake is always safe
+        task.setAutoDelete(False)
+
+        # results arrive on the GUI thread, maybe after something newer was sent
+        def on_result(result: Any) -> None:
+            if self.is_current(key, generation) and result_cb is not None:
+                result_cb(result)
+
+        def on_error(error: Exception) -> None:
+            if self.is_current(key, generation) and error_cb is not None:
+                error_cb(error)
+
+        def on_done() -> None:
+            state["alive"].pop(worker_id, None)
+            if state["latest"].get(key) is task:
+                del state["latest"][key]
+            if self.is_current(key, generation) and finished_cb is not None:
+                finished_cb()
+
+        task.signals.result.connect(on_result)
+        task.signals.error.connect(on_error)
+        task.signals.done.connect(on_done)
+
+        def start() -> None:
+            if not self.is_current(key, generation):
+                return
+            state["latest"][key] = task
+            state["alive"][worker_id] = task
+            self.pool.start(task)
+            log("sent worker to pool", "qt", id=worker_id, key=key)
+
+        if debounce_ms <= 0:
+            start()
+            return
+
+        timer = state["timers"].get(key)
+        if timer is None:
+            timer = state["timers"][key] = QTimer()
+            timer.setSingleShot(True)
+            timer.timeout.connect(lambda: state["pending"].pop(key, lambda: None)())
+        state["pending"][key] = start
+        timer.start(debounce_ms)
+
+    def supersede(self, key: str) -> None:
+        """
+        Drop everything sent for `key` so far: queued tasks never run,
+        running ones have their results ignored
+        """
+        state = self.task_state()
+        state["generations"][key] = state["generations"].get(key, 0) + 1
+        state["pending"].pop(key, None)
+
+        latest = state["latest"].pop(key, None)
+        if latest is not None and self.pool.tryTake(latest):
+            # never started, so no done signal is coming to clean it up
+            state["alive"].pop(id(latest), None)
+            log("dropped queued task", "qt", key=key)
+
+    def cancel_task(self, key: str) -> None:
+        self.supersede(key)
+        timer = self.task_state()["timers"].get(key)
+        if timer is not None:
+            timer.stop()
 
     def log(self, prefix, *args, **kwargs) -> None:
         print(prefix, args, kwargs)
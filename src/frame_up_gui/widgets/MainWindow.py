@@ -1,7 +1,9 @@
 from pathlib import Path
 
+from frame_up import tracing
 from frame_up.constants import accepted_image_extensions, version
 from frame_up.file import get_suggested_filepath
+from frame_up.pipeline import warm_up
 from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtGui import QPalette
 
@@ -12,7 +14,9 @@ from frame_up_gui.common import (
     ask_file_to_save,
 )
 from frame_up_gui.events import EventBus as bus
+from frame_up_gui.tasks import Task
 from frame_up_gui.widgets import CentralLayout
+from frame_up_gui.widgets.TraceOverlay import TraceOverlay
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -40,13 +44,14 @@ class MainWindow(QtWidgets.QMainWindow):
         self.constructMenuBar()
 
         self.setCentralWidget(CentralLayout())
+
+        self.trace_overlay = TraceOverlay()
+        self.statusBar().addPermanentWidget(self.trace_overlay)
         self.resize(400, 300)
         self.show()
 
-        # TODO/bcl: for testing purposes
-        self.imagePathChanged(
-            "C:/Users/bcliden/Pictures/Grain-Deer-Mushshroom-Environment.png"
-        )
+        # assets, filters and zmq load in the background once we're on screen
+        QtCore.QTimer.singleShot(0, self.warm_up)
 
     def constructMenuBar(self):
         toolbar = self.menuBar()
@@ -89,6 +94,23 @@ class MainWindow(QtWidgets.QMainWindow):
         quit_action.setShortcut("Ctrl+Q")
         fileMenu.addAction(quit_action)
 
+        toolsMenu = toolbar.addMenu("&Tools")
+        toolsMenu.setToolTipsVisible(True)
+
+        trace_action = QtGui.QAction(text="&Trace timings", parent=self)
+        trace_action.setCheckable(True)
+        trace_action.setChecked(tracing.enabled)
+        trace_action.setStatusTip("Time each step of the preview, save and email")
+        trace_action.setToolTip("Time each step of the preview, save and email")
+        trace_action.toggled.connect(self.toggle_tracing)
+        toolsMenu.addAction(trace_action)
+
+        export_trace_action = QtGui.QAction(text="&Export trace...", parent=self)
+        export_trace_action.setStatusTip("Save the timings for chrome://tracing")
+        export_trace_action.setToolTip("Save the timings for chrome://tracing")
+        export_trace_action.triggered.connect(self.export_trace)
+        toolsMenu.addAction(export_trace_action)
+
         helpMenu = toolbar.addMenu("&Help")
         helpMenu.setToolTipsVisible(True)
         helpMenu.setToolTip("What's going on here?")
@@ -152,6 +174,28 @@ class MainWindow(QtWidgets.QMainWindow):
             raise SystemError("Couldn't get email contact info from dialog...")
         bus.EmailCurrentImage.emit(info)
 
+    @QtCore.Slot()
+    def warm_up(self):
+        QtCore.QThreadPool.globalInstance().start(Task(warm_up))
+
+    @QtCore.Slot(bool)
+    def toggle_tracing(self, checked: bool):
+        if checked:
+            tracing.enable()
+        else:
+            tracing.disable()
+        self.trace_overlay.set_visible(checked)
+
+    @QtCore.Slot()
+    def export_trace(self):
+        filename, _ = QtWidgets.QFileDialog.getSaveFileName(
+            caption="Export trace",
+            dir=str(Path.home() / "frame_up_trace.json"),
+            filter="Chrome trace (*.json)",
+        )
+        if filename:
+            tracing.export_chrome_trace(filename)
+
     @QtCore.Slot()
     def quit(self):
         FrameUpApp.quit()
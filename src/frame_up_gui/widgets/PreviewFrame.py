@@ -1,26 +1,59 @@
+import queue
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
 from typing import Callable, Optional, Self
 
-from frame_up.file import open_from_disk, save_to_disk
-from frame_up.framing import frame_image
+from frame_up import tracing
+from frame_up.file import save_queue
 from frame_up.models import ImageEmailPayload
-from frame_up.services import (
-    antique_filter,
-    email_image,
-    monochrome_filter,
-    vibrant_filter,
+from frame_up.pipeline import (
+    Pipeline,
+    build_preview_pipeline,
+    render_full_image,
+    source_file,
 )
-from PIL.Image import Image
-from PIL.ImageQt import ImageQt
 from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtGui import QPalette
 
 from frame_up_gui.App import FrameUpApp
 from frame_up_gui.events import EventBus as bus
+from frame_up_gui.images import pil_to_qimage
 from frame_up_gui.tasks import BackgroundTasker
 from frame_up_gui.widgets.EmailDialog import EmailContactInfo
 
 default_intensity = 100
 
+# changes (path, filter, intensity) have to stop for this long (ms) before
+# a render starts, so dragging the slider doesn't queue one per step
+render_debounce_ms = 40
+
+# what show_image drops from the pipeline once the pixmap has its copy.
+# Only the filter/intensity stages rebuild them, and those replace them anyway.
+released_stages = ("filtered", "framed", "display")
+
+# smooth rescale once resizing has been quiet this long (ms)
+resize_settle_ms = 150
+# scaled pixmaps are cached per bucket of this many pixels
+resize_bucket_px = 32
+resize_cache_size = 8
+
+
+#
+#   Render stages, these run on the worker pool so no Qt widgets in here
+#
+
+
+def email_full_image(
+    info: EmailContactInfo, path: str, filter: Optional[str], intensity: float
+) -> bool:
+    from frame_up.services import email_image
+
+    image = render_full_image(path, filter, intensity)
+    payload = ImageEmailPayload(to=info.to, subject_line=info.subject, data=image)
+    return email_image(payload)
+
 
 def load_image_after(function: Callable):
     def wrapper(instance: "PreviewFrame", *args, **kwargs):
@@ -32,19 +65,29 @@ def load_image_after(function: Callable):
 
 
 class PreviewFrame(QtWidgets.QLabel, BackgroundTasker):
-    # Pillow Types
-    original_image: Optional[Image]
-    framed_image: Optional[Image]
+    # (filename, exception or None), emitted from the save thread
+    saved = QtCore.Signal(str, object)
 
     # QT Types
-    qt_image: Optional[ImageQt]
     qt_pixmap: Optional[QtGui.QPixmap]
     scaled_pixmap: Optional[QtGui.QPixmap]
+    scaled_cache: OrderedDict[tuple[int, int], QtGui.QPixmap]
+    resize_timer: QtCore.QTimer
 
     # Canvas management
     # image_canvas: QtWidgets.QLabel
     image_min_height: int
 
+    # busy / error overlay
+    status: QtWidgets.QLabel
+    render_generation: int
+    render_started: int  # perf_counter_ns of the newest load_image
+
+    # path/filter/intensity -> QImage. Between renders only "source" and
+    # "decoded" stay cached (so filter/intensity changes don't decode again),
+    # the later stages are released once they're on screen.
+    pipeline: Pipeline
+
     path: Optional[str]
     filter: Optional[str]
     intensity: Optional[int]
@@ -52,12 +95,15 @@ class PreviewFrame(QtWidgets.QLabel, BackgroundTasker):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.original_image = None
-        self.framed_image = None
-
-        self.qt_image = None
         self.qt_pixmap = None
         self.scaled_pixmap = None
+        self.scaled_cache = OrderedDict()
+
+        # fast rescale while dragging, smooth one after it settles
+        self.resize_timer = QtCore.QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(resize_settle_ms)
+        self.resize_timer.timeout.connect(self.resize_image)
 
         self.image_min_height = 300
 
@@ -65,13 +111,24 @@ class PreviewFrame(QtWidgets.QLabel, BackgroundTasker):
         self.filter = None
         self.intensity = None
 
+        self.render_generation = 0
+        self.render_started = 0
+        self.pipeline = build_preview_pipeline(display=pil_to_qimage)
+        self.status = QtWidgets.QLabel(self)
+        self.status.setStyleSheet(
+            "background: rgba(0, 0, 0, 160); color: white; padding: 4px;"
+        )
+        self.status.hide()
+
         # event connections
         bus.ImagePathChanged.connect(self.set_image_path)
         bus.SaveCurrentImage.connect(self.save_image)
         bus.EmailCurrentImage.connect(self.email_image)
+        self.saved.connect(self.save_finished)
 
         # TODO/bcl: should this just go in BackgroundTasker?
         FrameUpApp.instance().aboutToQuit.connect(self.clean_background_tasks)
+        FrameUpApp.instance().aboutToQuit.connect(save_queue.join)
 
         self.set_minimums(self.image_min_height)
         self.setBackgroundRole(QPalette.ColorRole.Base)
@@ -86,7 +143,10 @@ class PreviewFrame(QtWidgets.QLabel, BackgroundTasker):
 
     def resizeEvent(self, event: QtGui.QResizeEvent) -> None:
         # override of https://doc.qt.io/qt-6/qwidget.html#resizeEvent
-        self.resize_image()
+        # the preview doesn't depend on the widget's size (see
+        # pipeline.preview_bounds), so this never renders anything again
+        self.resize_image(smooth=False)
+        self.resize_timer.start()
 
     def aspectRatio(self) -> float:
         pm = self.scaled_pixmap
@@ -107,30 +167,53 @@ class PreviewFrame(QtWidgets.QLabel, BackgroundTasker):
 
     @QtCore.Slot(str)
     def save_image(self, filename) -> None:
-        if self.qt_image is None:
+        if self.path is None:
+            return
+        # full size render + encode both happen on the save thread
+        render = partial(
+            render_full_image, self.path, self.filter, self.get_intensity()
+        )
+        try:
+            future = save_queue.submit(filename, render, block=False)
+        except queue.Full:
+            self.show_status("Still saving earlier images, try again in a moment")
             return
-        save_to_disk(filename, self.qt_image)
+
+        def on_done(future: Future) -> None:
+            self.saved.emit(filename, future.exception())
+
+        future.add_done_callback(on_done)
+
+    @QtCore.Slot(str, object)
+    def save_finished(self, filename: str, error: Optional[Exception]) -> None:
+        if error is not None:
+            self.show_status(f"Saving {filename} failed: {error}")
+        else:
+            print(f"[save] wrote {filename}")
 
     @QtCore.Slot(EmailContactInfo)
     def email_image(self: Self, info: EmailContactInfo) -> None:
         """Get contact info from user and send email payload to service"""
 
-        image = self.framed_image
-        if not image:
+        if self.path is None:
             return
 
-        payload = ImageEmailPayload(to=info.to, subject_line=info.subject, data=image)
+        # the full size render happens on the worker too
         self.send_task(
-            email_image,
-            payload,
+            email_full_image,
+            info,
+            self.path,
+            self.filter,
+            self.get_intensity(),
             result_cb=lambda *a, **kw: print("[EMAIL] result:", *a, **kw),
             finished_cb=lambda *a, **kw: print("[EMAIL] job finished.", *a, **kw),
+            error_cb=lambda e: self.show_status(f"Email failed: {e}"),
         )
 
     @load_image_after
     @QtCore.Slot(str)
     def set_image_path(self, path: str) -> None:
-        self.path = path
+        self.path = path  # load_image hands it to the pipeline
 
     @load_image_after
     @QtCore.Slot(str)
@@ -139,62 +222,162 @@ class PreviewFrame(QtWidgets.QLabel, BackgroundTasker):
             self.filter = None
         else:
             self.filter = value
+        self.pipeline.set("filter", self.filter)
 
     @load_image_after
     @QtCore.Slot(int)
     def set_intensity(self, value: int) -> None:
         self.intensity = value
+        self.pipeline.set("intensity", self.get_intensity())
+
+    def get_intensity(self) -> float:
+        intensity = default_intensity if self.intensity is None else self.intensity
+        return intensity / 100
 
     def load_image(self) -> None:
+        """
+        Preview pipeline: source -> decoded -> filtered -> framed -> display,
+        on a proxy the size of the saved image. Each stage that isn't already cached in
+        `self.pipeline` runs on the worker pool, and only the newest request
+        makes it to the screen.
+        """
         if self.path is None:
             print("can't load an image without a path.")
             return
 
-        path = self.path
-        filter = self.filter
-        intensity = self.intensity or default_intensity
-
-        intensity2: float = intensity / 100
+        self.render_generation += 1
+        self.render_started = time.perf_counter_ns()
+        generation = self.render_generation
+        pipeline = self.pipeline
+        # stat'd again on every render, so a file edited on disk since the
+        # last one gets decoded again instead of showing the old pixels
+        pipeline.set("path", source_file(self.path))
+        stages = ["source", "decoded", "filtered", "framed", "display"]
+
+        def run(index: int, debounced: bool = False) -> None:
+            name = stages[index]
+            last = index == len(stages) - 1
+
+            if pipeline.is_cached(name):
+                if last:
+                    self.show_image(pipeline.get(name))
+                else:
+                    run(index + 1, debounced)
+                return
+
+            self.show_status("Rendering…")
+            # the first stage with work to do waits out bursts of changes
+            # (typing a path, dragging the slider), the rest start right away
+            self.run_stage(
+                generation,
+                name,
+                pipeline.get,
+                name,
+                then=self.show_image if last else lambda _: run(index + 1, True),
+                debounce_ms=0 if debounced else render_debounce_ms,
+            )
+
+        run(0)
+
+    def run_stage(
+        self,
+        generation: int,
+        name: str,
+        fn: Callable,
+        *args,
+        then: Callable,
+        debounce_ms: int = 0,
+    ) -> None:
+        @QtCore.Slot(object)
+        def on_result(result) -> None:
+            if generation == self.render_generation:
+                then(result)
+
+        @QtCore.Slot(object)
+        def on_error(error: Exception) -> None:
+            if generation == self.render_generation:
+                self.show_status(f"Preview failed ({name}): {error}")
 
-        self.reset()
-
-        self.original_image = open_from_disk(path)
-        self.filtered_image = self.original_image
-
-        match filter:
-            case "Antique":
-                self.filtered_image = antique_filter(self.original_image, intensity2)
-            case "Vibrant":
-                self.filtered_image = vibrant_filter(self.original_image, intensity2)
-            case "Monochrome":
-                self.filtered_image = monochrome_filter(self.original_image, intensity2)
-            case None:
-                pass
-            case _:
-                raise ValueError("Unknown filter: ", filter)
-
-        self.framed_image = frame_image(self.filtered_image)
+        self.send_task(
+            fn,
+            *args,
+            key=f"render:{name}",
+            debounce_ms=debounce_ms,
+            result_cb=on_result,
+            finished_cb=None,
+            error_cb=on_error,
+        )
 
-        self.qt_image = ImageQt(self.framed_image)
-        self.qt_pixmap = QtGui.QPixmap.fromImage(self.qt_image)
+    def show_image(self, qt_image: QtGui.QImage) -> None:
+        """Last stage, back on the GUI thread"""
+        # the pixmap has its own copy, so the QImage (and its pillow bytes)
+        # don't need to stick around after this
+        with tracing.span("qt.pixmap"):
+            self.qt_pixmap = QtGui.QPixmap.fromImage(qt_image)
+        for stage in released_stages:
+            self.pipeline.release(stage)
         self.scaled_pixmap = self.qt_pixmap  # will be resized below
+        self.scaled_cache.clear()
 
+        self.show_status(None)
         self.resize_image()
         self.set_minimums(height=self.scaled_pixmap.height())
 
-    def resize_image(self) -> None:
+        if tracing.enabled:
+            # whole request, from load_image to the pixels on screen
+            started = self.render_started
+            duration = time.perf_counter_ns() - started
+            tracing.record("X", "preview", "qt", started, duration, {"path": self.path})
+
+    def show_status(self, text: Optional[str]) -> None:
+        """Busy / error message over the preview, None hides it"""
+        if text is None:
+            self.status.hide()
+            return
+        self.status.setText(text)
+        self.status.adjustSize()
+        self.status.show()
+        self.status.raise_()
+
+    @QtCore.Slot()
+    def resize_image(self, smooth: bool = True) -> None:
         if self.qt_pixmap is None:
             # print("no pixmap to resize. exiting")
             return
 
         geometry = self.geometry()
         # print(f"previewframe w={geometry.width()} h={geometry.height()}")
-        self.scaled_pixmap = self.qt_pixmap.scaled(
-            geometry.width(),
-            geometry.height(),
-            QtCore.Qt.AspectRatioMode.KeepAspectRatio,
-            QtCore.Qt.TransformationMode.SmoothTransformation,
-        )
+
+        if not smooth:
+            # cheap enough to do on every resize event
+            self.scaled_pixmap = self.qt_pixmap.scaled(
+                geometry.width(),
+                geometry.height(),
+                QtCore.Qt.AspectRatioMode.KeepAspectRatio,
+                QtCore.Qt.TransformationMode.FastTransformation,
+            )
+            self.setPixmap(self.scaled_pixmap)
+            return
+
+        # round down to a bucket so nearby sizes share one smooth rescale
+        width = max(geometry.width() // resize_bucket_px, 1) * resize_bucket_px
+        height = max(geometry.height() // resize_bucket_px, 1) * resize_bucket_px
+
+        scaled = self.scaled_cache.get((width, height))
+        if scaled is None:
+            scaled = self.qt_pixmap.scaled(
+                width,
+                height,
+                QtCore.Qt.AspectRatioMode.KeepAspectRatio,
+                QtCore.Qt.TransformationMode.SmoothTransformation,
+            )
+            self.scaled_cache[(width, height)] = scaled
+            if len(self.scaled_cache) > resize_cache_size:
+                self.scaled_cache.popitem(last=False)
+        else:
+            self.scaled_cache.move_to_end((width, height))
+
+        self.scaled_pixmap = scaled
         self.setPixmap(self.scaled_pixmap)
 
     def set_minimums(self, height: Optional[int]):
@@ -211,9 +394,5 @@ class PreviewFrame(QtWidgets.QLabel, BackgroundTasker):
         self.setMinimumWidth(width)
 
     def reset(self):
-        self.original_image = None
-        self.framed_image = None
-
-        self.qt_image = None
         self.qt_pixmap = None
         self.scaled_pixmap = None
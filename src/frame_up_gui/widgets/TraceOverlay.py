@@ -0,0 +1,39 @@
+from frame_up import tracing
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QLabel
+
+# how often the timings get refreshed (ms)
+refresh_ms = 500
+
+# spans shown in the status bar, in pipeline order
+shown_spans = ["preview", "decode", "filter", "frame", "qt.convert", "save", "email"]
+
+
+class TraceOverlay(QLabel):
+    """Latest span timings in the status bar, only while tracing is on"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setToolTip("Last / mean milliseconds per step, see Tools > Trace timings")
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(refresh_ms)
+        self.timer.timeout.connect(self.refresh)
+        self.set_visible(tracing.enabled)
+
+    def set_visible(self, visible: bool) -> None:
+        self.setVisible(visible)
+        if visible:
+            self.refresh()
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def refresh(self) -> None:
+        summary = tracing.summary()
+        parts = [
+            f"{name} {summary[name]['last_ms']:.0f}/{summary[name]['mean_ms']:.0f}"
+            for name in shown_spans
+            if name in summary
+        ]
+        self.setText("  ·  ".join(parts) + " ms" if parts else "tracing…")
@@ -0,0 +1,68 @@
+import copy
+import os
+import tempfile
+
+# frame_up keeps its asset pack in the user's cache, keep the tests' apart
+os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp(prefix="frame_up_tests_")
+os.environ.pop("FRAME_UP_ASSET_PACK", None)
+
+import pytest
+from PIL import Image as im
+from PIL.Image import Image
+
+from frame_up import services
+
+
+@pytest.fixture(autouse=True)
+def service_config():
+    """Tests can repoint and retune services freely, it's all put back after"""
+    saved = (
+        copy.deepcopy(services.service_index),
+        copy.deepcopy(services.service_replicas),
+        dict(services.timeouts),
+        dict(services.filter_modes),
+        services.filter_cache.max_bytes,
+    )
+    yield
+    services.service_index.clear()
+    services.service_index.update(saved[0])
+    services.service_replicas.clear()
+    services.service_replicas.update(saved[1])
+    services.timeouts.update(saved[2])
+    services.filter_modes.update(saved[3])
+    services.filter_cache.max_bytes = saved[4]
+    services.filter_cache.clear()
+    services.service_protocols.clear()
+    services.unavailable_until.clear()
+    services.connection_pool.close()
+
+
+@pytest.fixture
+def standins():
+    """Every stand-in service on a free port, with services pointed at them"""
+    from frame_up.standins import start_standins, stop_standins, use_standins
+
+    servers = start_standins()
+    use_standins({name: server.port for name, server in servers.items()})
+    yield servers
+    services.connection_pool.close()
+    stop_standins(servers)
+
+
+def gradient(size: tuple[int, int] = (64, 48)) -> Image:
+    """Something with every channel varying, so filters have work to do"""
+    width, height = size
+    image = im.new("RGB", size)
+    image.putdata(
+        [
+            (x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height))
+            for y in range(height)
+            for x in range(width)
+        ]
+    )
+    return image
+
+
+@pytest.fixture
+def image() -> Image:
+    return gradient()
@@ -0,0 +1,65 @@
+import pytest
+
+from frame_up import assetpack, framing
+
+
+@pytest.fixture
+def pack_path(tmp_path):
+    return assetpack.build_pack(tmp_path / "frames.pack")
+
+
+@pytest.fixture
+def no_pack(monkeypatch):
+    """framing as if there was no pack, with nothing left over from other tests"""
+    monkeypatch.setattr(framing, "pack", None)
+    framing.slices.clear()
+    framing.clear_template_cache()
+    yield
+    framing.slices.clear()
+    framing.clear_template_cache()
+
+
+def test_pieces_match_the_decoded_asset(pack_path, no_pack):
+    pack = assetpack.AssetPack(pack_path)
+    for orientation in framing.frame_files:
+        cut = framing.get_slices(orientation)
+        resolution = pack.resolution(orientation, 1.0)
+        assert tuple(resolution["borders"]) == cut.borders
+        for name, piece in [*cut.corners.items(), *cut.edges.items()]:
+            packed = pack.piece(resolution, name)
+            assert packed.mode == piece.mode == "RGBA"
+            assert packed.tobytes() == piece.tobytes(), name
+
+
+def test_smallest_resolution_that_covers_the_scale(pack_path):
+    pack = assetpack.AssetPack(pack_path)
+    assert pack.resolution("landscape", 0.3)["scale"] == 0.5
+    assert pack.resolution("landscape", 0.1)["scale"] == 0.25
+    assert pack.resolution("landscape", 2)["scale"] == 1.0
+
+
+def test_framing_with_the_pack_matches_without(pack_path, no_pack, image, monkeypatch):
+    size = framing.fit_frame_size(image.size)
+    without = framing.frame_image(image, size)
+
+    framing.slices.clear()
+    framing.clear_template_cache()
+    monkeypatch.setattr(framing, "pack", assetpack.AssetPack(pack_path))
+    with_pack = framing.frame_image(image, size)
+    assert with_pack.tobytes() == without.tobytes()
+
+
+def test_stale_cached_pack_is_ignored(tmp_path, monkeypatch):
+    path = tmp_path / "frames.pack"
+    monkeypatch.setattr(assetpack, "default_pack_path", lambda: path)
+    assetpack.build_pack(path, {"landscape": assetpack.default_sources()["portrait"]})
+    assert assetpack.load_pack() is None
+    assert assetpack.ensure_pack() == path
+    assert assetpack.load_pack() is not None
+
+
+def test_not_a_pack(tmp_path):
+    path = tmp_path / "frames.pack"
+    path.write_bytes(b"something else entirely")
+    with pytest.raises(ValueError):
+        assetpack.AssetPack(path)
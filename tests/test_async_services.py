@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+import zmq.asyncio
+from PIL import ImageChops
+
+from frame_up import async_services, services
+from frame_up.standins import start_standins, stop_standins
+
+
+def run(coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            async_services.close_pool()
+
+    return asyncio.run(main())
+
+
+def same(a, b) -> bool:
+    return a.size == b.size and ImageChops.difference(a, b).getbbox() is None
+
+
+def test_matches_the_blocking_client(standins, image):
+    services.filter_cache.max_bytes = 0
+    for filter in ["antique", "vibrant", "monochrome"]:
+        for intensity in [0, 0.4, 1]:
+            blocking = services.get_filtered_image(filter, image, intensity)
+            result = run(
+                async_services.get_filtered_image_async(filter, image, intensity)
+            )
+            assert same(blocking, result)
+
+
+def test_timeout_does_not_fail_over(standins, image):
+    replica = start_standins(["antique"])["antique"]
+    try:
+        services.service_replicas["antique"] = [("127.0.0.1", str(replica.port))]
+        standins["antique"].config.latency = 0.6
+        services.filter_cache.max_bytes = 0
+
+        # the replica is idle, so the main endpoint goes first only if it's
+        # the least busy one: make the replica look busier
+        replica_endpoint = f"tcp://127.0.0.1:{replica.port}"
+        async_services.in_flight[replica_endpoint] = 1
+        response, _ = run(
+            async_services.send_recv_service_async(
+                "antique", *services.filter_request(image, 1), timeout=0.3
+            )
+        )
+        assert response is None
+        assert replica.requests == 0
+    finally:
+        async_services.in_flight.clear()
+        stop_standins({"antique": replica})
+
+
+def test_unreachable_falls_back_locally(image):
+    services.service_index["monochrome"] = {"host": "127.0.0.1", "port": "1"}
+    services.timeouts["send"] = 200
+    services.filter_cache.max_bytes = 0
+    result = run(
+        async_services.get_filtered_image_async(
+            "monochrome", image, 1, mode="remote-with-local-fallback", timeout=0.3
+        )
+    )
+    assert same(result, services.filters.monochrome_filter(image, 1))
+
+
+def test_cancelled_send_closes_the_socket(monkeypatch):
+    sockets = []
+
+    async def stuck_send(self, *args, **kwargs):
+        sockets.append(self)
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(zmq.asyncio.Socket, "send_multipart", stuck_send)
+
+    async def cancelled():
+        request = async_services.request_async("tcp://127.0.0.1:1", [b""], 1)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(request, 0.1)
+        assert async_services.get_pool().idle.get("tcp://127.0.0.1:1", []) == []
+
+    run(cancelled())
+    assert sockets[0].closed
+    assert async_services.in_flight["tcp://127.0.0.1:1"] == 0
@@ -0,0 +1,66 @@
+import pytest
+from PIL import Image as im
+
+from frame_up import batch
+
+
+@pytest.fixture
+def inputs(tmp_path, image):
+    source = tmp_path / "in"
+    source.mkdir()
+    image.resize((320, 240)).save(source / "good.jpg")
+    (source / "broken.jpg").write_bytes(b"not a jpeg")
+    return batch.collect_inputs([str(source)])
+
+
+def test_frames_and_cleans_up_after_failures(tmp_path, inputs):
+    output = tmp_path / "out"
+    result = batch.run_batch(inputs, output, workers=1, verbose=False)
+
+    assert result.processed == 1
+    assert [path for path, _ in result.failed] == [str(inputs[0])]
+    # the broken input's placeholder is gone, the good one got its image
+    assert [path.name for path in output.iterdir()] == ["good.jpg"]
+    with im.open(output / "good.jpg") as framed:
+        assert framed.width > 320 and framed.height > 240
+
+
+def test_interrupted_batch_leaves_no_placeholders(tmp_path, inputs, monkeypatch):
+    def interrupt(futures):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(batch, "as_completed", interrupt)
+    output = tmp_path / "out"
+    with pytest.raises(KeyboardInterrupt):
+        batch.run_batch(inputs, output, workers=1, verbose=False)
+    # a job already running may still finish, but nothing is left empty
+    assert all(path.stat().st_size > 0 for path in output.iterdir())
+
+
+def test_running_twice_only_frames_the_originals(tmp_path, image):
+    source = tmp_path / "in"
+    source.mkdir()
+    for name in ["a.jpg", "b.jpg"]:
+        image.save(source / name)
+
+    for _ in range(2):
+        inputs = batch.collect_inputs([str(source)])
+        assert [path.name for path in inputs] == ["a.jpg", "b.jpg"]
+        result = batch.run_batch(inputs, workers=1, verbose=False)
+        assert result.processed == 2
+
+    assert sorted(path.name for path in source.iterdir()) == [
+        "a.jpg",
+        "a_framed_0.jpg",
+        "a_framed_1.jpg",
+        "b.jpg",
+        "b_framed_0.jpg",
+        "b_framed_1.jpg",
+    ]
+
+
+def test_framed_outputs_named_directly_are_taken(tmp_path, image):
+    path = tmp_path / "a_framed_0.jpg"
+    image.save(path)
+    assert batch.collect_inputs([str(path)]) == [path.resolve()]
+    assert batch.collect_inputs([str(tmp_path)]) == []
@@ -0,0 +1,46 @@
+from frame_up import bench
+
+
+def report(**cases):
+    results = []
+    for case, (p50, error) in cases.items():
+        results.append(
+            {
+                "case": case,
+                "megapixels": 1,
+                "p50_ms": p50,
+                "p99_ms": p50,
+                "error": error,
+            }
+        )
+    return {"results": results}
+
+
+def test_slower_is_a_regression():
+    baseline = report(a=(10.0, None), b=(10.0, None))
+    current = report(a=(10.5, None), b=(12.0, None))
+    regressions = bench.compare_to_baseline(current, baseline)
+    assert len(regressions) == 2  # p50 and p99 of b
+    assert all(line.startswith("b @ 1 MP") for line in regressions)
+
+
+def test_failing_now_is_a_regression():
+    baseline = report(a=(10.0, None), b=(None, "TimeoutError()"))
+    current = report(a=(None, "SystemError('monochrome filter failed')"), b=(None, "x"))
+    regressions = bench.compare_to_baseline(current, baseline)
+    assert regressions == ["a @ 1 MP: failed (SystemError('monochrome filter failed'))"]
+
+
+def test_run_case_against_standins():
+    from frame_up.standins import start_standins, stop_standins
+
+    servers = start_standins(["monochrome"])
+    try:
+        result = bench.run_case(
+            "get_filtered_image", 0.05, 2, {"monochrome": servers["monochrome"].port}
+        )
+    finally:
+        stop_standins(servers)
+    assert result.error is None
+    assert result.runs == 2
+    assert result.p50_ms is not None and result.p50_ms > 0
@@ -0,0 +1,170 @@
+import os
+import queue
+import stat
+import threading
+from functools import partial
+
+import pytest
+from PIL import Image as im
+from PIL import ImageChops, ImageStat
+
+from frame_up import file
+from frame_up.framing import frame_image
+from frame_up.pipeline import render_full_image
+
+
+def test_suggestion_skips_taken_names(tmp_path):
+    (tmp_path / "photo.jpg").touch()
+    (tmp_path / "photo_framed_0.jpg").touch()
+    suggested = file.get_suggested_filepath(tmp_path, "photo.jpg")
+    assert suggested == tmp_path / "photo_framed_1.jpg"
+
+
+def test_suggestion_rechecks_the_cached_scan(tmp_path):
+    # caches the scan of an empty directory
+    assert file.get_suggested_filepath(tmp_path, "a.jpg") == tmp_path / "a.jpg"
+
+    # a file shows up within the same mtime tick: the directory looks unchanged
+    stamp = os.stat(tmp_path)
+    (tmp_path / "a.jpg").touch()
+    os.utime(tmp_path, ns=(stamp.st_atime_ns, stamp.st_mtime_ns))
+
+    assert file.get_suggested_filepath(tmp_path, "a.jpg") == tmp_path / "a_framed_0.jpg"
+
+
+def test_reserved_names_are_never_handed_out_twice(tmp_path):
+    reserved = {file.reserve_filepath(tmp_path, "photo.jpg") for _ in range(5)}
+    assert len(reserved) == 5
+    assert all(path.exists() for path in reserved)
+    assert file.get_suggested_filepath(tmp_path, "photo.jpg") not in reserved
+
+
+@pytest.fixture
+def scan(tmp_path, image):
+    """Big enough that the frame's window gets a reduced decode"""
+
+    def save(format):
+        path = tmp_path / f"scan.{format}"
+        image.resize((3000, 2250)).save(path)
+        return str(path)
+
+    return save
+
+
+def test_decode_over_the_budget_is_refused(scan):
+    path = scan("png")
+    with pytest.raises(ValueError, match="budget"):
+        file.open_for_size(path, (1000, 750), budget=2**20)
+    assert file.open_for_size(path, (1000, 750)).size == (1000, 750)
+
+
+def test_decode_for_an_empty_size_is_refused(scan):
+    with pytest.raises(ValueError, match="empty size"):
+        file.open_for_size(scan("png"), (0, 10))
+
+
+def test_decompression_bombs_are_refused(scan, monkeypatch):
+    path = scan("png")
+    monkeypatch.setattr(im, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(ValueError, match="too big"):
+        file.open_for_size(path, (1000, 750))
+
+
+def test_opening_leaves_pillow_limits_alone(scan):
+    limit = im.MAX_IMAGE_PIXELS
+    file.open_for_size(scan("jpg"), (1000, 750))
+    assert im.MAX_IMAGE_PIXELS == limit
+
+
+@pytest.mark.parametrize("format", ["jpg", "png"])
+def test_reduced_render_matches_the_full_decode(scan, format):
+    path = scan(format)
+    reduced = render_full_image(path, None, 1.0)
+
+    with im.open(path) as source:
+        full = frame_image(source.convert("RGB"), reduced.size)
+
+    assert reduced.size == full.size
+    difference = ImageStat.Stat(ImageChops.difference(reduced, full)).mean
+    assert max(difference) < 2
+
+
+def test_saving_over_a_file_keeps_its_mode(tmp_path, image):
+    path = tmp_path / "photo.jpg"
+    path.touch()
+    os.chmod(path, 0o640)
+    file.save_to_disk(str(path), image)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+    # new files get what any other new file in there would
+    (tmp_path / "plain").touch()
+    file.save_to_disk(str(tmp_path / "new.jpg"), image)
+    assert os.stat(tmp_path / "new.jpg").st_mode == os.stat(tmp_path / "plain").st_mode
+
+
+def test_failed_encode_leaves_the_target_alone(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"earlier save")
+    with pytest.raises(OSError):
+        # JPEG has no alpha channel
+        file.save_to_disk(str(path), im.new("RGBA", (8, 8)))
+    assert path.read_bytes() == b"earlier save"
+    assert os.listdir(tmp_path) == ["photo.jpg"]
+
+
+@pytest.mark.parametrize("extension", [".jpg", ".png"])
+def test_smallest_preset_beats_fast(tmp_path, image, extension):
+    image = image.resize((640, 480))
+    sizes = {}
+    for preset in file.encoder_presets:
+        path = tmp_path / f"{preset}{extension}"
+        file.save_to_disk(str(path), image, preset=preset)
+        sizes[preset] = path.stat().st_size
+        with im.open(path) as saved:
+            assert saved.size == image.size
+    assert sizes["smallest"] < sizes["fast"]
+
+
+def test_save_queue_pushes_back_when_full(tmp_path, image):
+    saves = file.SaveQueue(max_pending=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_render():
+        started.set()
+        release.wait(5)
+        return image
+
+    first = saves.submit(str(tmp_path / "a.jpg"), slow_render)
+    assert started.wait(5)
+    saves.submit(str(tmp_path / "b.jpg"), image)  # waits in line
+    with pytest.raises(queue.Full):
+        saves.submit(str(tmp_path / "c.jpg"), image, block=False)
+
+    assert saves.is_pending(tmp_path / "a.jpg")
+    assert saves.pending_in(str(tmp_path)) == {"a.jpg", "b.jpg"}
+
+    release.set()
+    saves.join()
+    assert first.result() == str(tmp_path / "a.jpg")
+    assert not saves.pending
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "b.jpg"]
+
+
+def test_save_queue_keeps_the_order(tmp_path, image):
+    saves = file.SaveQueue(max_pending=10)
+    order = []
+
+    def render(name):
+        order.append(name)
+        return image
+
+    futures = [
+        saves.submit(str(tmp_path / f"{n}.jpg"), partial(render, n)) for n in range(6)
+    ]
+    # the same path twice is counted twice
+    futures.append(saves.submit(str(tmp_path / "0.jpg"), partial(render, 0)))
+    saves.join()
+
+    assert order == [0, 1, 2, 3, 4, 5, 0]
+    assert all(future.result() for future in futures)
+    assert not saves.pending
@@ -0,0 +1,86 @@
+import pytest
+from PIL import ImageChops
+
+from frame_up import filters, services
+
+intensities = [0, 0.25, 0.5, 0.75, 1]
+
+
+def same(a, b) -> bool:
+    return a.size == b.size and ImageChops.difference(a, b).getbbox() is None
+
+
+@pytest.mark.parametrize("filter", ["antique", "vibrant", "monochrome"])
+@pytest.mark.parametrize("protocol", ["legacy", "binary", "auto"])
+def test_standin_round_trip_matches_local(standins, image, filter, protocol):
+    """
+    The stand-ins run the local filters themselves, so this checks the
+    transport: request/response encoding loses nothing on the way
+    """
+    services.service_index[filter]["protocol"] = protocol
+    services.filter_cache.max_bytes = 0
+    local = filters.local_filters[filter]
+    for intensity in intensities:
+        remote = services.get_filtered_image(
+            filter, image, intensity, mode="remote", exact=True
+        )
+        assert same(remote, local(image, intensity)), intensity
+
+
+# corners and middle of the conftest gradient, with the full effect
+reference_points = [(0, 0), (63, 0), (0, 47), (32, 24), (63, 47)]
+reference_pixels = {
+    "antique": [
+        (50, 40, 29),
+        (118, 92, 63),
+        (167, 139, 106),
+        (145, 113, 77),
+        (230, 218, 193),
+    ],
+    "vibrant": [
+        (0, 0, 0),
+        (255, 0, 205),
+        (0, 255, 45),
+        (127, 127, 127),
+        (255, 255, 255),
+    ],
+    # ITU-R 601 luma: (251, 0, 143) -> 0.299 * 251 + 0.114 * 143 = 91
+    "monochrome": [
+        (0, 0, 0),
+        (91, 91, 91),
+        (158, 158, 158),
+        (127, 127, 127),
+        (250, 250, 250),
+    ],
+}
+
+
+@pytest.mark.parametrize("filter", ["antique", "vibrant", "monochrome"])
+def test_local_filters_match_reference_pixels(image, filter):
+    result = filters.local_filters[filter](image, 1)
+    pixels = [result.getpixel(point) for point in reference_points]
+    assert pixels == reference_pixels[filter]
+
+
+@pytest.mark.parametrize("filter", ["antique", "vibrant", "monochrome"])
+def test_blended_matches_exact(standins, image, filter):
+    """Blending the full strength result is the same as asking for it"""
+    services.filter_cache.max_bytes = 0
+    for intensity in intensities:
+        blended = services.get_filtered_image(filter, image, intensity, mode="remote")
+        exact = filters.local_filters[filter](image, intensity)
+        assert same(blended, exact), intensity
+
+
+@pytest.mark.parametrize("filter", ["antique", "vibrant", "monochrome"])
+def test_keeps_alpha(image, filter):
+    rgba = image.convert("RGBA")
+    rgba.putalpha(128)
+    result = filters.local_filters[filter](rgba, 0.5)
+    assert result.mode == "RGBA"
+    assert result.getchannel("A").getextrema() == (128, 128)
+
+
+def test_zero_intensity_is_the_original(image):
+    for local in filters.local_filters.values():
+        assert same(local(image, 0), image)
@@ -0,0 +1,99 @@
+import pytest
+
+from frame_up import framing
+
+
+@pytest.fixture(params=["landscape", "portrait"])
+def orientation(request):
+    return request.param
+
+
+def test_frame_scale_never_upscales(orientation):
+    width, height = framing.get_geometry(orientation).size
+    assert framing.frame_scale(orientation, (width, height)) == 1.0
+    assert framing.frame_scale(orientation, (width * 3, height * 3)) == 1.0
+    assert framing.frame_scale(orientation, (width // 2, height // 2)) == pytest.approx(
+        0.5, abs=0.01
+    )
+
+
+def test_large_frames_keep_the_asset_border(orientation):
+    geometry = framing.get_geometry(orientation)
+    width, height = geometry.size
+    big = (width * 2, height * 2)
+    assert framing.scaled_borders(orientation, big) == geometry.borders
+
+
+def test_fit_frame_size(image):
+    size = framing.fit_frame_size(image.size)
+    assert framing.orientation_for(size) == framing.orientation_for(image.size)
+    width, height = framing.get_geometry("landscape").size
+    assert size[0] <= width and size[1] <= height
+
+    small = framing.fit_frame_size(image.size, (width // 2, height // 2))
+    assert small[0] <= width // 2 and small[1] <= height // 2
+
+
+@pytest.mark.parametrize("bounds", [None, (500, 500), (2048, 2048)])
+def test_extreme_aspects_stay_in_bounds(bounds):
+    for image_size in [(1, 1000), (1000, 1), (1, 100_000), (100_000, 1)]:
+        geometry = framing.get_geometry(framing.orientation_for(image_size))
+        width, height = framing.fit_frame_size(image_size, bounds)
+        most_width, most_height = bounds or geometry.size
+        scale = min(most_width / geometry.size[0], most_height / geometry.size[1], 1)
+        assert width <= round(geometry.size[0] * scale), image_size
+        assert height <= round(geometry.size[1] * scale), image_size
+
+
+def test_window_keeps_the_aspect_ratio(image):
+    for image_size in [(1600, 900), (900, 1600), (1000, 1000), (4000, 3000)]:
+        size = framing.fit_frame_size(image_size)
+        left, up, right, down = framing.inner_box(size)
+        window_aspect = (right - left) / (down - up)
+        assert window_aspect == pytest.approx(image_size[0] / image_size[1], rel=0.05)
+
+
+def test_frame_image(image):
+    framed = framing.frame_image(image)
+    assert framed.size == framing.fit_frame_size(image.size)
+    assert framed.mode == framing.frame_mode
+
+    # the picture shows in the middle, the frame all around it
+    left, up, right, down = framing.inner_box(framed.size)
+    middle = ((left + right) // 2, (up + down) // 2)
+    source = image.getpixel((image.width // 2, image.height // 2))
+    assert all(abs(a - b) <= 8 for a, b in zip(framed.getpixel(middle), source))
+
+
+def test_threads_dont_change_the_result(image):
+    large = image.resize((1600, 1200))
+    size = framing.fit_frame_size(large.size)
+    one = framing.frame_image(large, size, threads=1)
+    four = framing.frame_image(large, size, threads=4)
+    # bands are resized apart, which can differ by a rounding step
+    assert max(abs(a - b) for a, b in zip(one.tobytes(), four.tobytes())) <= 1
+
+
+def test_border_templates_evict_least_recently_used(monkeypatch):
+    framing.clear_template_cache()
+    sizes = [(400, 300), (408, 306), (404, 303)]  # the last one is smaller
+
+    def nbytes(border):
+        return sum(framing.image_nbytes(piece) for piece, _ in border)
+
+    # room for the first two, not all three
+    a, b = (framing.get_border("landscape", size) for size in sizes[:2])
+    monkeypatch.setattr(framing, "template_cache_limit", nbytes(a) + nbytes(b))
+
+    assert framing.get_border("landscape", sizes[0]) is a  # now the newest
+    c = framing.get_border("landscape", sizes[2])
+
+    assert list(framing.templates) == [("landscape", sizes[0]), ("landscape", sizes[2])]
+    assert framing.templates_nbytes == nbytes(a) + nbytes(c)
+    assert framing.templates_nbytes <= framing.template_cache_limit
+
+    # one too big for the limit is still kept, on its own
+    monkeypatch.setattr(framing, "template_cache_limit", 1)
+    framing.get_border("landscape", sizes[1])
+    assert list(framing.templates) == [("landscape", sizes[1])]
+    framing.clear_template_cache()
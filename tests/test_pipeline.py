@@ -0,0 +1,63 @@
+import pytest
+
+from frame_up import pipeline, services
+from frame_up.framing import fit_frame_size
+
+
+@pytest.fixture(autouse=True)
+def local_filters():
+    for filter in services.filter_modes:
+        services.filter_modes[filter] = "local"
+
+
+@pytest.fixture
+def photo(tmp_path, image):
+    path = tmp_path / "photo.jpg"
+    image.resize((1200, 900)).save(path)
+    return str(path)
+
+
+def test_stages_only_rerun_downstream_of_a_change(photo):
+    preview = pipeline.build_preview_pipeline()
+    preview.set("path", pipeline.source_file(photo))
+    first = preview.get("display")
+    assert first.size == fit_frame_size((1200, 900))
+
+    preview.set("filter", "monochrome")
+    preview.set("intensity", 0.5)
+    preview.get("display")
+    preview.set("intensity", 0.25)
+    preview.get("display")
+
+    assert preview.runs["source"] == 1
+    assert preview.runs["decoded"] == 1
+    assert preview.runs["filtered"] == 3
+    assert preview.runs["framed"] == 3
+
+
+def test_preview_matches_the_saved_image(photo):
+    preview = pipeline.build_preview_pipeline()
+    preview.set("path", pipeline.source_file(photo))
+    preview.set("filter", "vibrant")
+    preview.set("intensity", 0.5)
+    saved = pipeline.render_full_image(photo, "vibrant", 0.5)
+    assert preview.get("framed").tobytes() == saved.tobytes()
+
+
+def test_unchanged_input_keeps_the_cache(photo):
+    preview = pipeline.build_preview_pipeline()
+    preview.set("path", pipeline.source_file(photo))
+    preview.get("framed")
+    assert not preview.set("path", pipeline.source_file(photo))
+    assert preview.is_cached("framed")
+
+
+def test_editing_the_file_invalidates_the_preview(photo, image):
+    preview = pipeline.build_preview_pipeline()
+    preview.set("path", pipeline.source_file(photo))
+    before = preview.get("framed")
+
+    image.resize((900, 1200)).save(photo)
+    assert preview.set("path", pipeline.source_file(photo))
+    after = preview.get("framed")
+    assert after.size == fit_frame_size((900, 1200)) != before.size
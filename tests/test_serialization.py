@@ -0,0 +1,46 @@
+from hashlib import blake2b
+
+import pytest
+from PIL import ImageChops
+
+from frame_up import serialization
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "LA"])
+@pytest.mark.parametrize("encoding", ["raw", "png"])
+def test_lossless_round_trip(image, mode, encoding):
+    original = image.convert(mode)
+    frames = serialization.pack_frames({"status": "ok"}, original, encoding)
+    header, decoded = serialization.unpack_frames([bytes(f) for f in frames])
+    assert header["status"] == "ok"
+    assert decoded is not None and decoded.mode == mode
+    assert ImageChops.difference(decoded, original).getbbox() is None
+
+
+def test_jpeg_round_trip(image):
+    frames = serialization.pack_frames({}, image, "jpeg")
+    _, decoded = serialization.unpack_frames(frames)
+    assert decoded is not None and decoded.size == image.size
+
+
+def test_legacy_reply_has_no_image():
+    header, decoded = serialization.unpack_frames([b'{"status": "ok"}'])
+    assert header == {"status": "ok"} and decoded is None
+
+
+def test_digest_is_the_hash_of_all_the_pixels(image, monkeypatch):
+    # small bands, so the image gets hashed in several of them
+    monkeypatch.setattr(serialization, "digest_band_bytes", 1000)
+    whole = blake2b(digest_size=16)
+    whole.update(f"RGB:{image.width}x{image.height}".encode())
+    whole.update(image.tobytes())
+    assert serialization.image_digest(image) == whole.hexdigest()
+
+
+def test_digest_tells_images_apart(image):
+    changed = image.copy()
+    changed.putpixel((image.width - 1, image.height - 1), (1, 2, 3))
+    assert serialization.image_digest(image) != serialization.image_digest(changed)
+    assert serialization.image_digest(image) != serialization.image_digest(
+        image.convert("RGBA")
+    )
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from frame_up import services
+
+
+def test_recv_timeout_is_not_retried(standins, image):
+    server = standins["antique"]
+    services.timeouts["recv"] = 300
+    services.filter_cache.max_bytes = 0
+
+    # leaves a socket in the pool, the next request goes out on it
+    services.get_filtered_image("antique", image, mode="remote", exact=True)
+    reused = services.connection_pool.stats()["reused"]
+
+    server.config.latency = 0.6
+    with pytest.raises(SystemError):
+        services.get_filtered_image("antique", image, mode="remote", exact=True)
+
+    assert services.connection_pool.stats()["reused"] == reused + 1
+
+    time.sleep(1.0)  # anything sent twice would have arrived by now
+    assert server.requests == 2
+
+
+def test_send_recv_service_answers(standins, image):
+    response, result = services.send_recv_service(
+        "vibrant", *services.filter_request(image, 1), idempotent=True
+    )
+    assert response is not None and response["status"] == "ok"
+    assert result is not None and result.size == image.size
+
+
+def test_filter_cache_evicts_least_recently_used(image):
+    # 64x48 RGB, three fit
+    cache = services.FilterCache(max_bytes=3 * 64 * 48 * 3)
+    for key in "abc":
+        cache.put(key, image)
+
+    assert cache.get("a") is image  # now the newest
+    cache.put("d", image)
+
+    assert cache.get("b") is None
+    assert [cache.get(key) is image for key in "acd"] == [True, True, True]
+    assert cache.stats() == {
+        "hits": 4,
+        "misses": 1,
+        "entries": 3,
+        "bytes": 3 * 64 * 48 * 3,
+    }
+
+
+def test_filter_cache_stays_within_its_bytes(image):
+    cache = services.FilterCache(max_bytes=64 * 48 * 3 + 100)
+    cache.put("small", image.resize((10, 10)))
+    cache.put("big", image)
+    assert cache.nbytes <= cache.max_bytes
+    assert cache.get("small") is None
+
+    # the same key again replaces it instead of counting it twice
+    cache.put("big", image)
+    assert cache.nbytes == 64 * 48 * 3
+
+    # bigger than the whole cache: not kept, and nothing else flushed out
+    cache.put("huge", image.resize((640, 480)))
+    assert cache.get("huge") is None
+    assert cache.get("big") is image
@@ -0,0 +1,33 @@
+from frame_up import loadgen, services
+from frame_up.standins import StandinConfig, start_standins, stop_standins, use_standins
+
+
+def test_load_against_replicas(image):
+    servers = start_standins(["vibrant"]) | {
+        "replica": start_standins(["vibrant"])["vibrant"]
+    }
+    try:
+        use_standins({"vibrant": servers["vibrant"].port})
+        services.service_replicas["vibrant"] = [
+            ("127.0.0.1", str(servers["replica"].port))
+        ]
+        result = loadgen.run_load("vibrant", megapixels=0.01, concurrency=4, total=20)
+    finally:
+        stop_standins(servers)
+
+    assert result.requests == 20 and result.errors == 0
+    # plus the warm up request
+    assert sum(server.requests for server in servers.values()) == 21
+    assert all(server.requests for server in servers.values())
+
+
+def test_failing_standin_answers_with_errors(image):
+    servers = start_standins(["email"], config=StandinConfig(error_rate=1.0))
+    try:
+        use_standins({"email": servers["email"].port})
+        result = loadgen.run_load("email", megapixels=0.01, concurrency=2, total=5)
+    finally:
+        stop_standins(servers)
+
+    assert result.requests == 0 and result.errors == 5
+    assert servers["email"].errors == 6  # with the warm up request
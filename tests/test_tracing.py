@@ -0,0 +1,91 @@
+import json
+import threading
+
+import pytest
+
+from frame_up import tracing
+
+
+@pytest.fixture(autouse=True)
+def trace():
+    was_enabled = tracing.enabled
+    tracing.enable()
+    tracing.clear()
+    yield
+    tracing.clear()
+    if not was_enabled:
+        tracing.disable()
+
+
+def spans() -> dict[str, tracing.Event]:
+    return {event[1]: event for event in tracing.events if event[0] == "X"}
+
+
+def test_nested_spans_sit_inside_each_other():
+    with tracing.span("outer", path="a.jpg"):
+        with tracing.span("inner"):
+            pass
+        with tracing.span("inner"):
+            pass
+
+    recorded = spans()
+    _, _, _, outer_start, outer_duration, outer_tid, args = recorded["outer"]
+    _, _, _, inner_start, inner_duration, inner_tid, _ = recorded["inner"]
+    assert outer_start <= inner_start
+    assert inner_start + inner_duration <= outer_start + outer_duration
+    assert outer_tid == inner_tid == threading.get_ident()
+    assert args == {"path": "a.jpg"}
+
+    summary = tracing.summary()
+    assert summary["inner"]["count"] == 2
+    assert summary["outer"]["count"] == 1
+    assert summary["outer"]["total_ms"] >= summary["inner"]["total_ms"]
+
+
+def test_disabled_spans_record_nothing():
+    tracing.disable()
+    with tracing.span("ignored"):
+        tracing.log("ignored too")
+    assert not tracing.events
+    assert tracing.summary() == {}
+
+
+def test_chrome_trace_format(tmp_path):
+    def work():
+        with tracing.span("worker", size=(4, 3)):
+            tracing.log("halfway", "zmq", endpoint="tcp://x")
+
+    thread = threading.Thread(target=work, name="frame_up-test")
+    thread.start()
+    thread.join()
+
+    path = tmp_path / "trace.json"
+    tracing.export_chrome_trace(str(path))
+    trace = json.loads(path.read_text())
+    assert trace["displayTimeUnit"] == "ms"
+    events = {event["name"]: event for event in trace["traceEvents"]}
+
+    # threads are named, and events point at them by tid
+    names = [event for event in trace["traceEvents"] if event["ph"] == "M"]
+    assert {"name": "frame_up-test"} in [event["args"] for event in names]
+    tid = events["worker"]["tid"]
+    assert any(event["tid"] == tid for event in names)
+
+    worker = events["worker"]
+    assert worker["ph"] == "X" and worker["cat"] == "frame_up"
+    assert worker["dur"] >= 0
+    assert worker["args"] == {"size": "(4, 3)"}  # args are strings
+
+    halfway = events["halfway"]
+    assert halfway["ph"] == "i" and halfway["s"] == "t"
+    assert halfway["cat"] == "zmq" and halfway["tid"] == tid
+    # microseconds, inside the span
+    assert worker["ts"] <= halfway["ts"] <= worker["ts"] + worker["dur"]
+
+
+def test_gui_tasks_only_describe_their_args(image):
+    tasks = pytest.importorskip("frame_up_gui.tasks")
+    tasks.Task(lambda image, n: None, image, 3).run()
+    _, _, category, _, _, _, args = spans()["task"]
+    assert category == "qt"
+    assert isinstance(args["args"], str) and "PIL" in args["args"]